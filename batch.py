@@ -0,0 +1,403 @@
+import argparse
+import json
+import logging
+import os
+import time
+import uuid
+
+import instrument
+from compact import plan_prompts
+from summarizer import MODELS, add_usage, estimate_tokens, new_usage
+from transport import RetryPolicy, call_with_retry, get_breaker, http_client
+
+logger = logging.getLogger(__name__)
+
+MAX_COMPLETION_TOKENS = 1000
+
+
+def write_requests(path, requests, line):
+    with open(path, 'w') as f:
+        for custom_id, prompt in requests:
+            f.write(json.dumps(line(custom_id, prompt)) + '\n')
+    return path
+
+
+class LocalFileTransport:
+    """File-based stand-in for a provider batch API.
+
+    Jobs are request/result JSONL pairs in ``directory``. Results are written
+    by ``complete(prompt)`` once a job is ``delay`` seconds old, or by any
+    external process that drops a ``<job>.results.jsonl`` file next to the
+    requests.
+    """
+    provider = "local"
+
+    def __init__(self, directory, complete=None, delay=0.0, model="local"):
+        self.directory = directory
+        self.complete = complete
+        self.delay = delay
+        self.model = model
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id, kind):
+        return os.path.join(self.directory, f"{job_id}.{kind}.jsonl")
+
+    def submit(self, requests):
+        job_id = f"batch_{uuid.uuid4().hex[:12]}"
+        write_requests(self._path(job_id, 'requests'), requests,
+                       lambda custom_id, prompt: {'custom_id': custom_id, 'prompt': prompt})
+        return job_id
+
+    def poll(self, job_id):
+        results = self._path(job_id, 'results')
+        if os.path.exists(results):
+            return 'completed'
+        requests = self._path(job_id, 'requests')
+        if self.complete is None or time.time() - os.path.getmtime(requests) < self.delay:
+            return 'in_progress'
+        with open(requests) as f, open(results + '.tmp', 'w') as out:
+            for line in f:
+                request = json.loads(line)
+                try:
+                    entry = {'custom_id': request['custom_id'], 'completion': self.complete(request['prompt'])}
+                except Exception as e:
+                    entry = {'custom_id': request['custom_id'], 'error': str(e)}
+                out.write(json.dumps(entry) + '\n')
+        os.replace(results + '.tmp', results)
+        return 'completed'
+
+    def results(self, job_id):
+        with open(self._path(job_id, 'results')) as f:
+            for line in f:
+                entry = json.loads(line)
+                yield entry['custom_id'], entry.get('completion'), entry.get('error')
+
+
+class OpenAIBatchTransport:
+    provider = "openai"
+
+    def __init__(self, directory, model=None, client=None):
+        self.directory = directory
+        self.model = model or MODELS["openai"]
+        self._client = client
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def client(self):
+        if self._client is None:
+            import openai
+            self._client = openai.OpenAI(max_retries=0, http_client=http_client(openai.DefaultHttpxClient))
+        return self._client
+
+    def submit(self, requests):
+        path = write_requests(
+            os.path.join(self.directory, f"openai_{uuid.uuid4().hex[:12]}.requests.jsonl"), requests,
+            lambda custom_id, prompt: {
+                'custom_id': custom_id,
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': {'model': self.model, 'messages': [{'role': 'user', 'content': prompt}]}
+            }
+        )
+        with open(path, 'rb') as f:
+            upload = self.client.files.create(file=f, purpose='batch')
+        job = self.client.batches.create(
+            input_file_id=upload.id, endpoint='/v1/chat/completions', completion_window='24h'
+        )
+        return job.id
+
+    def poll(self, job_id):
+        status = self.client.batches.retrieve(job_id).status
+        if status in ('failed', 'expired', 'cancelled'):
+            return 'failed'
+        return 'completed' if status == 'completed' else 'in_progress'
+
+    def results(self, job_id):
+        job = self.client.batches.retrieve(job_id)
+        for file_id in (job.output_file_id, job.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                entry = json.loads(line)
+                response = entry.get('response') or {}
+                if entry.get('error') or response.get('status_code') != 200:
+                    yield entry['custom_id'], None, str(entry.get('error') or response.get('body'))
+                else:
+                    yield entry['custom_id'], response['body']['choices'][0]['message']['content'].strip(), None
+
+
+class AnthropicBatchTransport:
+    provider = "anthropic"
+
+    def __init__(self, directory, model=None, client=None, max_tokens=MAX_COMPLETION_TOKENS):
+        self.directory = directory
+        self.model = model or MODELS["anthropic"]
+        self.max_tokens = max_tokens
+        self._client = client
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def client(self):
+        if self._client is None:
+            import anthropic
+            self._client = anthropic.Anthropic(max_retries=0, http_client=http_client(anthropic.DefaultHttpxClient))
+        return self._client
+
+    def _request(self, custom_id, prompt):
+        return {
+            'custom_id': custom_id,
+            'params': {
+                'model': self.model,
+                'max_tokens': self.max_tokens,
+                'messages': [{'role': 'user', 'content': prompt}]
+            }
+        }
+
+    def submit(self, requests):
+        # The request file is kept locally for auditing; the API takes the requests inline
+        write_requests(os.path.join(self.directory, f"anthropic_{uuid.uuid4().hex[:12]}.requests.jsonl"),
+                       requests, self._request)
+        job = self.client.messages.batches.create(
+            requests=[self._request(custom_id, prompt) for custom_id, prompt in requests]
+        )
+        return job.id
+
+    def poll(self, job_id):
+        status = self.client.messages.batches.retrieve(job_id).processing_status
+        return 'completed' if status == 'ended' else 'in_progress'
+
+    def results(self, job_id):
+        for entry in self.client.messages.batches.results(job_id):
+            if entry.result.type == 'succeeded':
+                yield entry.custom_id, entry.result.message.content[0].text.strip(), None
+            else:
+                yield entry.custom_id, None, entry.result.type
+
+
+TRANSPORTS = {
+    "local": LocalFileTransport,
+    "openai": OpenAIBatchTransport,
+    "anthropic": AnthropicBatchTransport,
+}
+
+
+def run_job(transport, requests, poll_interval=60.0, timeout=None, retry_policy=None):
+    if not requests:
+        return {}
+    # Submit, poll and result downloads go through the same retry and breaker as live requests
+    policy = retry_policy or RetryPolicy()
+    breaker = get_breaker(f'{transport.provider}-batch')
+
+    def call(fn, name):
+        return call_with_retry(fn, policy, breaker, name)
+
+    with instrument.span('batch.job', provider=transport.provider, requests=len(requests)):
+        job_id = call(lambda: transport.submit(requests), 'batch.submit')
+        logger.info(f'Submitted batch {job_id} with {len(requests)} requests to {transport.provider}')
+        started = time.monotonic()
+        while True:
+            status = call(lambda: transport.poll(job_id), 'batch.poll')
+            if status == 'completed':
+                break
+            if status == 'failed':
+                raise RuntimeError(f'Batch {job_id} failed')
+            if timeout is not None and time.monotonic() - started > timeout:
+                raise TimeoutError(f'Batch {job_id} still running after {timeout} seconds')
+            logger.debug(f'Batch {job_id} {status}')
+            time.sleep(poll_interval)
+
+    completions = {}
+    for custom_id, completion, error in call(lambda: list(transport.results(job_id)), 'batch.results'):
+        if error is not None:
+            logger.error(f'Batch request {custom_id} failed: {error}')
+            instrument.count('batch.failed')
+            continue
+        completions[custom_id] = completion
+    instrument.count('batch.requests', len(requests))
+    logger.info(f'Batch {job_id} finished: {len(completions)}/{len(requests)} succeeded')
+    return completions
+
+
+def summarize_batch(transport, items, max_tokens=None, cache=None, poll_interval=60.0, timeout=None,
+                    parsed=None, usage=None, retry_policy=None):
+    """Summarize ``(row_id, code)`` pairs through a batch transport.
+
+    Returns a dict of row id to summary. Modules over ``max_tokens`` take a
+    second batch that combines their section summaries. ``parsed`` maps row
+    ids to parse results for compact prompts; ``usage``, if given, is filled
+    with each row's token counts.
+    """
+
+    def cached(text, template):
+        if cache is None:
+            return None
+        return cache.get_summary(text, transport.provider, transport.model, template)
+
+    def charge(custom_id, prompt, completion, live):
+        if usage is not None and completion is not None:
+            add_usage(usage[custom_id.split('_')[0]], estimate_tokens(prompt), estimate_tokens(completion),
+                      0.0 if live else None)
+
+    def run(prompts):
+        # prompts: custom_id -> (text, template)
+        done = {}
+        pending = []
+        for custom_id, (text, template) in prompts.items():
+            prompt = template.format(code=text)
+            hit = cached(text, template)
+            if hit is not None:
+                done[custom_id] = hit
+                charge(custom_id, prompt, hit, False)
+                continue
+            pending.append((custom_id, prompt))
+            instrument.count('llm.prompt_tokens', estimate_tokens(prompt))
+        completions = run_job(transport, pending, poll_interval, timeout, retry_policy)
+        for custom_id, prompt in pending:
+            charge(custom_id, prompt, completions.get(custom_id), True)
+        if cache is not None:
+            for custom_id, completion in completions.items():
+                text, template = prompts[custom_id]
+                cache.set_summary(text, transport.provider, transport.model, template, completion)
+        done.update(completions)
+        return done
+
+    # Custom ids are limited to [A-Za-z0-9_-] by the Anthropic batch API
+    first = {}
+    sections = {}
+    for row_id, code in items:
+        mode, prompts, combine = plan_prompts(code, max_tokens, (parsed or {}).get(str(row_id)))
+        if usage is not None:
+            usage[str(row_id)] = new_usage(mode)
+        if combine is None:
+            first[str(row_id)] = prompts[0]
+            continue
+        sections[str(row_id)] = (len(prompts), combine)
+        for part, prompt in enumerate(prompts):
+            first[f"{row_id}_{part}"] = prompt
+    results = run(first)
+
+    second = {}
+    for row_id, (parts, combine) in sections.items():
+        section_summaries = [results.get(f"{row_id}_{part}") for part in range(parts)]
+        if None in section_summaries:
+            logger.error(f'Skipping combined summary for row {row_id}: a section failed')
+            continue
+        second[row_id] = combine(section_summaries)
+    results.update(run(second))
+
+    return {str(row_id): results[str(row_id)] for row_id, _ in items if str(row_id) in results}
+
+
+def merge_summaries(output_path, summaries):
+    with open(output_path) as f:
+        chunks = json.load(f)
+    merged = 0
+    for chunk in chunks:
+        if chunk['id'] in summaries:
+            chunk['summary'] = summaries[chunk['id']]
+            merged += 1
+    with open(output_path + '.tmp', 'w') as f:
+        json.dump(chunks, f, indent=2)
+    os.replace(output_path + '.tmp', output_path)
+    logger.info(f'Merged {merged}/{len(chunks)} summaries into {output_path}')
+    return chunks
+
+
+def get_transport(name, directory, model=None, complete=None, delay=0.0):
+    if name == "local":
+        return LocalFileTransport(directory, complete=complete, delay=delay)
+    if name not in TRANSPORTS:
+        raise ValueError(f"Unsupported batch transport: {name}")
+    return TRANSPORTS[name](directory, model=model)
+
+
+def local_completer(cassette_path=None):
+    if cassette_path is None:
+        return lambda prompt: f"Batch stub summary ({estimate_tokens(prompt)} prompt tokens)"
+    from cassette import Cassette
+    cassette = Cassette(cassette_path)
+    return lambda prompt: cassette.lookup(prompt)['completion']
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-summarize every module of an output JSON through a provider batch API."
+    )
+
+    parser.add_argument(
+        "--output",
+        required=True,
+        help="Output JSON from main.py; summaries are replaced in place by row id."
+    )
+
+    parser.add_argument(
+        "--transport",
+        choices=sorted(TRANSPORTS),
+        required=True,
+        help="Batch API to submit to; local uses a file-based stand-in."
+    )
+
+    parser.add_argument(
+        "--model",
+        default=None,
+        help="Model name (default: the provider's model from summarizer.MODELS)."
+    )
+
+    parser.add_argument(
+        "--batch_dir",
+        default="./batch_jobs",
+        help="Directory for batch request and result files."
+    )
+
+    parser.add_argument(
+        "--cassette",
+        default=None,
+        help="For --transport local, answer requests from this recorded JSONL cassette."
+    )
+
+    parser.add_argument(
+        "--chunk_tokens",
+        type=int,
+        default=6000,
+        help="Token budget per request; larger modules are summarized per section."
+    )
+
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=60.0,
+        help="Seconds between batch status checks."
+    )
+
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Give up if a batch is still running after this many seconds."
+    )
+
+    parser.add_argument(
+        "--log_level",
+        default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="Logging verbosity."
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format="%(message)s")
+
+    complete = None
+    if args.transport == "local":
+        complete = local_completer(args.cassette)
+    transport = get_transport(args.transport, args.batch_dir, args.model, complete)
+
+    with open(args.output) as f:
+        items = [(chunk['id'], chunk['original_code']) for chunk in json.load(f)]
+    summaries = summarize_batch(transport, items, args.chunk_tokens, poll_interval=args.poll_interval,
+                                timeout=args.timeout)
+    merge_summaries(args.output, summaries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import compact
+import extract
+import parse_code
+import prepare_data
+from embedding import FakeEmbedder
+from summarizer import estimate_tokens
+
+
+OPERATORS = ['&', '|', '^', '+']
+
+
+def generate_module(name='bench', ports=100, assigns=100, always_blocks=0, parameters=0, children=()):
+    assigns = max(assigns, 1)
+    lines = [f'module {name} (']
+    if always_blocks or children:
+        lines.append('    input clk,')
+    lines += [f'    input [7:0] in_{i},' for i in range(ports)]
+    lines.append('    output [7:0] out_0')
+    lines.append(');')
+    lines += [f'parameter P_{i} = {i + 1};' for i in range(parameters)]
+    lines += [f'wire [7:0] w_{i};' for i in range(assigns)]
+    lines += [f'reg [7:0] r_{i};' for i in range(always_blocks)]
+    for i in range(assigns):
+        op = OPERATORS[i % len(OPERATORS)] if parameters or always_blocks or children else '&'
+        rhs = f'P_{i % parameters}' if parameters and i % 2 else f'in_{(i + 1) % ports}'
+        lines.append(f'assign w_{i} = in_{i % ports} {op} {rhs};')
+    lines.append('assign out_0 = w_0;')
+    lines += [f'{child} u_{k} (clk, w_{k % assigns});' for k, child in enumerate(children)]
+    # The heuristic parser treats everything after the first always as its body
+    for i in range(always_blocks):
+        lines.append('always @(posedge clk) begin')
+        lines.append(f'    r_{i} <= w_{i % assigns} ^ r_{i};')
+        lines.append('end')
+    lines.append('endmodule')
+    return '\n'.join(lines)
+
+
+def generate_design(out_dir, files=10, ports=50, assigns=100, always_blocks=5, parameters=5,
+                    instantiations=3, seed=0):
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    for i in range(files):
+        children = [f'mod_{rng.randrange(i)}' for _ in range(instantiations)] if i else []
+        code = generate_module(f'mod_{i}', ports, assigns, always_blocks, parameters, children)
+        with open(os.path.join(out_dir, f'mod_{i}.v'), 'w') as f:
+            f.write(code + '\n')
+
+
+def bench_parse_scaling(sizes, repeat=3):
+    results = []
+    for size in sizes:
+        code = generate_module(ports=size, assigns=size)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                parse_code.parse_verilog_code(code, None, use_pyverilog=False)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results.append({
+            'size': size,
+            'seconds': round(best, 6),
+            'us_per_item': round(best / (2 * size) * 1e6, 3)
+        })
+    return results
+
+
+def generate_entities(operations=1000, parameters=100, signals=200):
+    params = [(f'P_{i}', str(i)) for i in range(parameters)]
+    inputs = [(f'in_{i}', f'[P_{i % parameters}-1:0]' if parameters else '1') for i in range(signals)]
+    outputs = [('out_0', '1')]
+    wires = [(f'w_{i}', 'wire', '[7:0]') for i in range(operations)]
+    ops = []
+    for i in range(operations):
+        a = f'in_{i % signals}'
+        b = f'w_{(i + 1) % operations}'
+        param = f'P_{i % parameters}' if parameters else '1'
+        ops.append({
+            'id': f'op{i}',
+            'type': 'ADD',
+            'target': f'w_{i}',
+            'expression': f'{a} + {b} + {param}',
+            'operands': [a, b, param],
+            'context': 'combinational'
+        })
+    return 'bench', inputs, outputs, wires, params, ops
+
+
+def bench_extract(sizes, parameters=200, repeat=3):
+    results = []
+    for size in sizes:
+        entities = generate_entities(operations=size, parameters=parameters)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _, _, _, _, relationships = extract.extract_entities(*entities)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results.append({
+            'operations': size,
+            'parameters': parameters,
+            'relationships': len(relationships),
+            'seconds': round(best, 6),
+            'us_per_operation': round(best / size * 1e6, 3)
+        })
+    return results
+
+
+def measure(fn, memory=True):
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn()
+    stats = {
+        'wall_seconds': round(time.perf_counter() - start_wall, 6),
+        'cpu_seconds': round(time.process_time() - start_cpu, 6)
+    }
+    if memory:
+        # A second, traced run so allocation tracking does not skew the timings
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        stats['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, stats
+
+
+def bench_pipeline(config, workdir, memory=True, use_pyverilog=False, kg_format='nt'):
+    rtl_dir = os.path.join(workdir, 'rtl')
+    generate_design(rtl_dir, **config)
+    stages = {}
+
+    def record(name, fn, items, **counts):
+        result, stats = measure(fn, memory)
+        stats['items'] = items(result) if callable(items) else items
+        stats['items_per_second'] = round(stats['items'] / stats['wall_seconds'], 3) if stats['wall_seconds'] else None
+        stats.update({key: value(result) for key, value in counts.items()})
+        stages[name] = stats
+        return result
+
+    rows = record('prepare_data', lambda: prepare_data.load_sv_files(rtl_dir), len,
+                  bytes=lambda rows: sum(len(row['code']) for row in rows))
+
+    parsed = record(
+        'parse_verilog_code',
+        lambda: [parse_code.parse_verilog_code(row['code'], [rtl_dir], use_pyverilog=use_pyverilog) for row in rows],
+        len,
+        operations=lambda results: sum(len(r[5]) for r in results)
+    )
+
+    entities = record(
+        'extract_entities',
+        lambda: [extract.extract_entities(*result) for result in parsed],
+        len,
+        relationships=lambda results: sum(len(e[4]) for e in results)
+    )
+
+    kg_dir = os.path.join(workdir, 'kg')
+    os.makedirs(kg_dir, exist_ok=True)
+    record(
+        'create_knowledge_graph',
+        lambda: [extract.create_knowledge_graph(*e, os.path.join(kg_dir, f'kg_{i}.{kg_format}'), kg_format)
+                 for i, e in enumerate(entities)],
+        len(entities)
+    )
+
+    import main as pipeline
+    chunks = [{
+        'id': str(i),
+        'text': row['text'],
+        'original_code': row['code'],
+        'summary': 'benchmark summary'
+    } for i, row in enumerate(rows)]
+    chroma_dir = os.path.join(workdir, 'chroma')
+
+    def embed_and_store():
+        embedder = FakeEmbedder()
+        embeddings = pipeline.generate_code_embeddings(chunks, embedder)
+        pipeline.store_in_chroma(chunks, embeddings, chroma_dir, embedder=embedder)
+
+    record('embed_and_store', embed_and_store, len(chunks))
+    return stages
+
+
+def prompt_tokens(code, max_tokens, parsed=None):
+    # First-round prompts only; a combining prompt depends on the section summaries
+    mode, prompts, _ = compact.plan_prompts(code, max_tokens, parsed)
+    return mode, sum(estimate_tokens(template.format(code=text)) for text, template in prompts), len(prompts)
+
+
+def bench_prompts(rows, max_tokens=6000, use_pyverilog=False):
+    modules = []
+    totals = {'full': 0, 'compact': 0}
+    start = time.perf_counter()
+    for row in rows:
+        with contextlib.redirect_stdout(io.StringIO()):
+            parsed = parse_code.parse_verilog_code(row['code'], None, use_pyverilog=use_pyverilog)
+        _, full, full_requests = prompt_tokens(row['code'], max_tokens)
+        mode, reduced, requests = prompt_tokens(row['code'], max_tokens, parsed)
+        totals['full'] += full
+        totals['compact'] += reduced
+        modules.append({
+            'file': prepare_data.row_filename(row),
+            'mode': mode,
+            'full_tokens': full,
+            'compact_tokens': reduced,
+            'full_requests': full_requests,
+            'compact_requests': requests
+        })
+    return {
+        'modules': len(modules),
+        'full_tokens': totals['full'],
+        'compact_tokens': totals['compact'],
+        'reduction': round(1 - totals['compact'] / totals['full'], 4) if totals['full'] else None,
+        'seconds': round(time.perf_counter() - start, 6),
+        'per_module': modules
+    }
+
+
+def usage_totals(output_path):
+    # Sums the llm_usage that main.py records per module, to compare runs in different prompt modes
+    totals = {'modules': 0, 'modes': {}, 'requests': 0, 'cached': 0, 'prompt_tokens': 0,
+              'completion_tokens': 0, 'latency': 0.0}
+    for chunk in prepare_data.iter_dataset(output_path):
+        usage = chunk.get('llm_usage')
+        if not usage:
+            continue
+        totals['modules'] += 1
+        totals['modes'][usage['prompt_mode']] = totals['modes'].get(usage['prompt_mode'], 0) + 1
+        for key in ('requests', 'cached', 'prompt_tokens', 'completion_tokens', 'latency'):
+            totals[key] += usage[key]
+    totals['latency'] = round(totals['latency'], 6)
+    return totals
+
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def bench_startup(module='main', repeat=5, top=15):
+    # Fresh interpreters, so nothing is served from an already-populated sys.modules
+    code = f"import resource, {module}; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True, cwd=cwd
+        )
+        wall = time.perf_counter() - start
+        modules = {}
+        for line in proc.stderr.splitlines():
+            match = IMPORTTIME_RE.match(line)
+            if match:
+                modules[match.group(4)] = int(match.group(2))
+        runs.append((wall, modules, int(proc.stdout.split()[-1])))
+
+    best_wall, modules, _ = min(runs, key=lambda run: run[0])
+    # Only top-level packages, so nested submodules are not counted twice
+    packages = {name: us for name, us in modules.items() if '.' not in name and name != module}
+    return {
+        'module': module,
+        'wall_seconds': round(best_wall, 6),
+        'import_seconds': round(modules.get(module, 0) / 1e6, 6),
+        'max_rss_kb': min(run[2] for run in runs),
+        'modules_loaded': len(modules),
+        'slowest_imports_ms': {
+            name: round(us / 1000, 3)
+            for name, us in sorted(packages.items(), key=lambda item: -item[1])[:top]
+        }
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_report(report, output=None):
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark pipeline stages on synthetic Verilog."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scaling = subparsers.add_parser(
+        "parse-scaling",
+        help="Time the heuristic parser on modules with N ports and N assigns."
+    )
+    scaling.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 5000, 10000, 20000],
+        help="Port/assign counts to generate."
+    )
+    scaling.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Runs per size; the fastest is reported."
+    )
+
+    extract_bench = subparsers.add_parser(
+        "extract",
+        help="Time extract_entities on synthetic modules with N operations."
+    )
+    extract_bench.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 5000, 20000],
+        help="Operation counts to generate."
+    )
+    extract_bench.add_argument(
+        "--parameters",
+        type=int,
+        default=200,
+        help="Parameters declared in each synthetic module."
+    )
+    extract_bench.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Runs per size; the fastest is reported."
+    )
+
+    pipeline = subparsers.add_parser(
+        "pipeline",
+        help="Time every pipeline stage on a generated multi-file design."
+    )
+    pipeline.add_argument("--files", type=int, default=20, help="Number of generated RTL files.")
+    pipeline.add_argument("--ports", type=int, default=50, help="Input ports per module.")
+    pipeline.add_argument("--assigns", type=int, default=200, help="Continuous assigns per module.")
+    pipeline.add_argument("--always_blocks", type=int, default=20, help="Always blocks per module.")
+    pipeline.add_argument("--parameters", type=int, default=10, help="Parameters per module.")
+    pipeline.add_argument("--instantiations", type=int, default=3, help="Child instances per module.")
+    pipeline.add_argument("--seed", type=int, default=0, help="Random seed for the design generator.")
+    pipeline.add_argument("--kg_format", choices=extract.KG_FORMATS, default="nt", help="KG output format to time.")
+    pipeline.add_argument("--pyverilog", action="store_true", help="Include the pyverilog pass when parsing.")
+    pipeline.add_argument("--no_memory", action="store_true", help="Skip the traced run that measures peak memory.")
+    pipeline.add_argument("--output", default=None, help="Also write the JSON report to this file.")
+
+    startup = subparsers.add_parser(
+        "startup",
+        help="Measure interpreter start-up and import time of a module with python -X importtime."
+    )
+    startup.add_argument("--module", default="main", help="Module to import.")
+    startup.add_argument("--repeat", type=int, default=5, help="Runs; the fastest is reported.")
+    startup.add_argument("--top", type=int, default=15, help="Number of slowest top-level imports to list.")
+    startup.add_argument("--output", default=None, help="Also write the JSON report to this file.")
+
+    prompts = subparsers.add_parser(
+        "prompts",
+        help="Compare full and compact summary prompt sizes, and the llm_usage recorded by real runs."
+    )
+    prompts.add_argument("--input", default=None, help="Dataset (JSON/JSONL) to measure instead of a generated design.")
+    prompts.add_argument("--files", type=int, default=20, help="Number of generated RTL files.")
+    prompts.add_argument("--ports", type=int, default=50, help="Input ports per module.")
+    prompts.add_argument("--assigns", type=int, default=200, help="Continuous assigns per module.")
+    prompts.add_argument("--always_blocks", type=int, default=20, help="Always blocks per module.")
+    prompts.add_argument("--parameters", type=int, default=10, help="Parameters per module.")
+    prompts.add_argument("--instantiations", type=int, default=3, help="Child instances per module.")
+    prompts.add_argument("--seed", type=int, default=0, help="Random seed for the design generator.")
+    prompts.add_argument("--chunk_tokens", type=int, default=6000, help="Token budget per request.")
+    prompts.add_argument("--pyverilog", action="store_true", help="Include the pyverilog pass when parsing.")
+    prompts.add_argument("--usage", nargs="*", default=[], help="main.py output JSONs whose llm_usage to total.")
+    prompts.add_argument("--output", default=None, help="Also write the JSON report to this file.")
+
+    args = parser.parse_args()
+
+    if args.command == "parse-scaling":
+        print(json.dumps(bench_parse_scaling(args.sizes, args.repeat), indent=2))
+    elif args.command == "extract":
+        print(json.dumps(bench_extract(args.sizes, args.parameters, args.repeat), indent=2))
+    elif args.command == "pipeline":
+        config = {
+            'files': args.files,
+            'ports': args.ports,
+            'assigns': args.assigns,
+            'always_blocks': args.always_blocks,
+            'parameters': args.parameters,
+            'instantiations': args.instantiations,
+            'seed': args.seed
+        }
+        with tempfile.TemporaryDirectory() as workdir:
+            stages = bench_pipeline(config, workdir, not args.no_memory, args.pyverilog, args.kg_format)
+        write_report({
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'config': dict(config, kg_format=args.kg_format, pyverilog=args.pyverilog),
+            'stages': stages
+        }, args.output)
+    elif args.command == "prompts":
+        if args.input:
+            rows = list(prepare_data.iter_dataset(args.input))
+            source = args.input
+        else:
+            source = {
+                'files': args.files,
+                'ports': args.ports,
+                'assigns': args.assigns,
+                'always_blocks': args.always_blocks,
+                'parameters': args.parameters,
+                'instantiations': args.instantiations,
+                'seed': args.seed
+            }
+            with tempfile.TemporaryDirectory() as workdir:
+                generate_design(workdir, **source)
+                rows = prepare_data.load_sv_files(workdir)
+        write_report({
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'source': source,
+            'chunk_tokens': args.chunk_tokens,
+            'prompts': bench_prompts(rows, args.chunk_tokens, args.pyverilog),
+            'usage': {path: usage_totals(path) for path in args.usage}
+        }, args.output)
+    elif args.command == "startup":
+        write_report({
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'startup': bench_startup(args.module, args.repeat, args.top)
+        }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class DiskCache:
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, max_age=None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created = row
+            if self.max_age is not None and now - created > self.max_age:
+                self._delete(key)
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._delete(key)
+            self._conn.execute(
+                "INSERT INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now)
+            )
+            self._total += len(value)
+            self._evict(now)
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._delete(key)
+            self._conn.commit()
+
+    def _delete(self, key):
+        row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._total -= row[0]
+
+    def _evict(self, now):
+        if self.max_age is not None:
+            cutoff = now - self.max_age
+            expired = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries WHERE created < ?", (cutoff,)
+            ).fetchone()[0]
+            if expired:
+                self._conn.execute("DELETE FROM entries WHERE created < ?", (cutoff,))
+                self._total -= expired
+        # Least recently accessed entries go first once the size budget is exceeded
+        while self.max_bytes is not None and self._total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._total -= size
+                if self._total <= self.max_bytes:
+                    break
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': entries,
+            'bytes': self._total
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def hash_key(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        data = part.encode('utf-8') if isinstance(part, str) else part
+        h.update(len(data).to_bytes(8, 'big'))
+        h.update(data)
+    return h.hexdigest()
+
+
+class SummaryCache(DiskCache):
+    def key(self, code, provider, model, template):
+        return hash_key(code.strip(), provider, model, template)
+
+    def get_summary(self, code, provider, model, template):
+        value = self.get(self.key(code, provider, model, template))
+        return value.decode('utf-8') if value is not None else None
+
+    def set_summary(self, code, provider, model, template, summary):
+        self.set(self.key(code, provider, model, template), summary.encode('utf-8'))
+
+
+class ParseCache(DiskCache):
+    # Bump when the parser output changes so stale entries stop matching
+    VERSION = '2'
+
+    def key(self, code, include_hashes):
+        parts = [self.VERSION, code]
+        for name, digest in include_hashes:
+            parts.extend([name, digest])
+        return hash_key(*parts)
+
+    def get_result(self, key):
+        value = self.get(key)
+        if value is None:
+            return None
+        return pickle.loads(zlib.decompress(value))
+
+    def set_result(self, key, result):
+        self.set(key, zlib.compress(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)))
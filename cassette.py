@@ -0,0 +1,48 @@
+import hashlib
+import json
+import os
+import threading
+
+
+def prompt_key(prompt):
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    """Recorded LLM completions in a JSONL file, keyed by the prompt's sha256."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry['prompt_sha256']] = entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, prompt):
+        entry = self.entries.get(prompt_key(prompt))
+        if entry is None:
+            raise KeyError(f"Prompt {prompt_key(prompt)[:12]} is not in cassette {self.path}")
+        return entry
+
+    def record(self, prompt, completion, latency, provider, model, prompt_tokens=None):
+        entry = {
+            'prompt_sha256': prompt_key(prompt),
+            'provider': provider,
+            'model': model,
+            'prompt_tokens': prompt_tokens,
+            'latency': round(latency, 6),
+            'completion': completion
+        }
+        # Appends are flushed per entry so an interrupted run keeps what it recorded
+        with self._lock:
+            self.entries[entry['prompt_sha256']] = entry
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+        return entry
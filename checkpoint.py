@@ -0,0 +1,113 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def code_digest(code):
+    return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+
+class Journal:
+    """Append-only JSONL record of rows that made it through the pipeline.
+
+    Each line holds one finished row: its summary, parse result and KG
+    path. Lines are flushed and fsynced as they are written, so a crash
+    loses at most the row in flight.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.entries = self.load(path) if resume else {}
+        self._lock = threading.Lock()
+        self._file = open(path, 'a' if resume else 'w')
+        if resume and self._file.tell() and not self._ends_with_newline(path):
+            # Start after a torn line rather than appending to it
+            self._file.write('\n')
+
+    @staticmethod
+    def _ends_with_newline(path):
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    @staticmethod
+    def load(path):
+        entries = {}
+        if not os.path.exists(path):
+            return entries
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from an interrupted write
+                    logger.warning(f'Ignoring incomplete checkpoint line in {path}')
+                    continue
+                entries[entry['row']] = entry
+        return entries
+
+    def completed(self, row, code, kg_file):
+        entry = self.entries.get(row)
+        if entry is None or entry['code_sha256'] != code_digest(code):
+            return None
+        if entry['kg_file'] != kg_file or not os.path.exists(kg_file):
+            return None
+        return entry
+
+    def append(self, row, code, chunk, parsed, kg_file):
+        entry = {
+            'row': row,
+            'code_sha256': code_digest(code),
+            # The code is already in the dataset; keeping the key holds its place in the output
+            'chunk': dict(chunk, original_code=None),
+            'parsed': list(parsed[:6]),
+            'kg_file': kg_file
+        }
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        return entry
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JsonArrayWriter:
+    """Writes a JSON array one element at a time, so it never sits in memory whole."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = open(path + '.tmp', 'w')
+        self._file.write('[')
+
+    def write(self, item):
+        self._file.write(',\n' if self.count else '\n')
+        # Indented like json.dump(items, indent=2) would lay out the whole array
+        self._file.write('\n'.join('  ' + line for line in json.dumps(item, indent=2).splitlines()))
+        self.count += 1
+
+    def close(self):
+        self._file.write('\n]' if self.count else ']')
+        self._file.close()
+        os.replace(self.path + '.tmp', self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+        else:
+            self._file.close()
@@ -0,0 +1,83 @@
+import re
+
+from summarizer import estimate_tokens
+
+BOUNDARY_RE = re.compile(r'^\s*(?:always(?:_ff|_comb|_latch)?|assign|initial|generate)\b')
+INSTANCE_START_RE = re.compile(r'^\s*(\w+)\s+(?:#\s*\(.*\)\s*)?(\w+)\s*\(')
+OPEN_RE = re.compile(r'\b(?:begin|case|casex|casez|fork|function|task)\b')
+CLOSE_RE = re.compile(r'\b(?:end|endcase|join|join_any|join_none|endfunction|endtask)\b')
+COMMENT_RE = re.compile(r'//.*')
+
+NOT_INSTANCE = {
+    'module', 'input', 'output', 'inout', 'wire', 'reg', 'logic', 'integer', 'genvar',
+    'parameter', 'localparam', 'function', 'task', 'if', 'else', 'for', 'while', 'case',
+    'begin', 'end', 'assign', 'always', 'initial', 'generate'
+}
+
+
+def is_boundary(line):
+    if BOUNDARY_RE.match(line):
+        return True
+    match = INSTANCE_START_RE.match(line)
+    return bool(match) and match.group(1) not in NOT_INSTANCE
+
+
+def split_units(lines):
+    # Top-level always/assign/instance statements start a unit; nested blocks never do
+    units = []
+    start = 0
+    depth = 0
+    for i, line in enumerate(lines):
+        if depth == 0 and i > start and is_boundary(line):
+            units.append((start, i))
+            start = i
+        code = COMMENT_RE.sub('', line)
+        depth = max(0, depth + len(OPEN_RE.findall(code)) - len(CLOSE_RE.findall(code)))
+    if start < len(lines):
+        units.append((start, len(lines)))
+    return units
+
+
+def chunk_module(code, max_tokens=6000):
+    """Split a module into line spans that each fit ``max_tokens``.
+
+    Spans are half-open ``(start, end)`` line ranges. A module that already
+    fits comes back as a single span.
+    """
+    lines = code.splitlines()
+    if not max_tokens or estimate_tokens(code) <= max_tokens:
+        return [(0, len(lines))]
+
+    # Prefix sums of line lengths give the size of any span without joining it
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line) + 1)
+
+    def span_tokens(start, end):
+        return max(1, (offsets[end] - offsets[start] - 1) // 4)
+
+    pieces = []
+    for start, end in split_units(lines):
+        if span_tokens(start, end) <= max_tokens:
+            pieces.append((start, end))
+            continue
+        # Oversized units (e.g. one huge always block) fall back to line boundaries
+        piece_start = start
+        for i in range(start + 1, end):
+            if span_tokens(piece_start, i + 1) > max_tokens:
+                pieces.append((piece_start, i))
+                piece_start = i
+        pieces.append((piece_start, end))
+
+    spans = []
+    for start, end in pieces:
+        if spans and span_tokens(spans[-1][0], end) <= max_tokens:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    return spans
+
+
+def segment_texts(code, spans):
+    lines = code.splitlines()
+    return ['\n'.join(lines[start:end]) for start, end in spans]
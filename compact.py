@@ -0,0 +1,194 @@
+import re
+from collections import Counter
+
+import chunker
+from summarizer import (
+    COMBINE_TEMPLATE, COMPACT_TEMPLATE, PROMPT_TEMPLATE, SECTION_TEMPLATE, combine_sections, estimate_tokens
+)
+
+PROMPT_MODES = ("full", "compact")
+
+# Instances with more named connections than this have their port maps shortened
+MAX_CONNECTIONS = 4
+# Runs of at least this many repeats of same-shaped lines or statements are elided
+MIN_RUN = 4
+# Longest repeating pattern of shapes looked for, e.g. assigns cycling through four operators
+MAX_PERIOD = 4
+
+NAMED_CONNECTION_RE = re.compile(r'\.\w+\s*\(')
+INDEX_RE = re.compile(r'\d+')
+NAME_INDEX_RE = re.compile(r'^(.*?)(\d+)$')
+
+
+def _group_names(entries):
+    # [(name, label)] -> ["in_0..in_99 [7:0]", ...]; indexed names of one label collapse into a range
+    groups = []
+    for name, label in entries:
+        match = NAME_INDEX_RE.match(name)
+        stem = match.group(1) if match else None
+        if groups and stem is not None and groups[-1][0] == stem and groups[-1][1] == label:
+            groups[-1][2].append(name)
+        else:
+            groups.append((stem, label, [name]))
+    items = []
+    for _, label, names in groups:
+        if len(names) > 2:
+            items.append(f"{names[0]}..{names[-1]} ({len(names)}) {label}".strip())
+        else:
+            items += [f"{name} {label}".strip() for name in names]
+    return ', '.join(items) or 'none'
+
+
+def _width(width):
+    return '' if width in (None, '', '1') else width
+
+
+def module_digest(module_name, input_ports, output_ports, signals, parameters, operations):
+    """Plain-text summary of a parsed module: interface, state and operation mix."""
+    instances = [op for op in operations if op['type'] == 'INSTANTIATION']
+    logic = Counter(
+        (op['context'] or 'other', op['type']) for op in operations if op['type'] != 'INSTANTIATION'
+    )
+    by_context = {}
+    for (context, op_type), count in sorted(logic.items()):
+        by_context.setdefault(context, []).append(f"{count} {op_type}")
+
+    lines = [
+        f"Module: {module_name}",
+        f"Parameters ({len(parameters)}): " + (', '.join(f"{name} = {value}" for name, value in parameters) or 'none'),
+        f"Inputs ({len(input_ports)}): " + _group_names([(name, _width(width)) for name, width in input_ports]),
+        f"Outputs ({len(output_ports)}): " + _group_names([(name, _width(width)) for name, width in output_ports]),
+        f"Internal signals ({len(signals)}): " + _group_names(
+            [(name, f"{s_type} {_width(width)}".strip()) for name, s_type, width in signals]
+        ),
+        "Operations: " + ('; '.join(
+            f"{context}: {', '.join(counts)}" for context, counts in by_context.items()
+        ) or 'none'),
+    ]
+    if instances:
+        by_type = {}
+        for op in instances:
+            by_type.setdefault(op['expression'].split('(')[0], []).append(op['target'])
+        lines.append(f"Instances ({len(instances)}): " + ', '.join(
+            f"{module_type} x{len(names)} ({_group_names([(name, '') for name in names])})"
+            for module_type, names in by_type.items()
+        ))
+    return '\n'.join(lines)
+
+
+def _shorten_instance(lines):
+    # Keeps the instance header and its first connections, drops the rest of the port map
+    statement = '\n'.join(lines)
+    connections = NAMED_CONNECTION_RE.findall(statement)
+    if len(connections) <= MAX_CONNECTIONS:
+        return lines
+    kept = []
+    seen = 0
+    for line in lines:
+        seen += len(NAMED_CONNECTION_RE.findall(line))
+        kept.append(line)
+        if seen >= MAX_CONNECTIONS:
+            break
+    indent = re.match(r'\s*', kept[-1]).group(0)
+    closing = re.match(r'\s*', lines[0]).group(0)
+    return kept + [f"{indent}// ... {len(connections) - seen} more port connections elided", f"{closing});"]
+
+
+def _elide_runs(blocks, shape, what):
+    # blocks: list of line lists. A run of MIN_RUN or more repeats of one pattern of up to
+    # MAX_PERIOD shapes keeps its first two repeats and its last one.
+    shapes = [shape(block) for block in blocks]
+    out = []
+    i = 0
+    while i < len(blocks):
+        best = (1, 1)
+        for period in range(1, MAX_PERIOD + 1):
+            j = i + period
+            while j < len(blocks) and shapes[j] == shapes[j - period]:
+                j += 1
+            repeats = (j - i) // period
+            if repeats >= MIN_RUN and repeats * period > best[0] * best[1]:
+                best = (period, repeats)
+        period, repeats = best
+        if repeats < MIN_RUN:
+            out += blocks[i]
+            i += 1
+            continue
+        end = i + period * repeats
+        indent = re.match(r'\s*', blocks[i][0]).group(0)
+        for block in blocks[i:i + 2 * period]:
+            out += block
+        out.append(f"{indent}// ... {(repeats - 3) * period} similar {what} elided")
+        for block in blocks[end - period:end]:
+            out += block
+        i = end
+    return out
+
+
+def compact_code(code):
+    """Drops blank lines, shortens long instance port maps and elides repetitive statements."""
+    lines = [line.rstrip() for line in code.splitlines() if line.strip()]
+
+    units = []
+    for start, end in chunker.split_units(lines):
+        unit = lines[start:end]
+        match = chunker.INSTANCE_START_RE.match(unit[0])
+        if match and match.group(1) not in chunker.NOT_INSTANCE:
+            # The statement ends at its closing ');'; declarations may follow in the same unit
+            end_at = next((k for k, line in enumerate(unit) if ');' in line), len(unit) - 1)
+            units.append(_shorten_instance(unit[:end_at + 1]))
+            units += [[line] for line in unit[end_at + 1:]]
+        else:
+            units.append(unit)
+
+    # Statements first (repeated always blocks, instances), then single lines (assigns, declarations)
+    lines = _elide_runs(units, lambda unit: INDEX_RE.sub('#', '\n'.join(unit).strip()), 'statements')
+    lines = _elide_runs([[line] for line in lines], lambda unit: INDEX_RE.sub('#', unit[0].strip()), 'lines')
+    return '\n'.join(lines)
+
+
+def compact_text(digest, code):
+    return f"Module digest:\n{digest}\n\nVerilog Code (repetitive statements elided):\n```verilog\n{code}\n```"
+
+
+def _plan(code, max_tokens, digest):
+    budget = max_tokens
+    if max_tokens and digest is not None:
+        budget = max(1, max_tokens - estimate_tokens(digest))
+    spans = chunker.chunk_module(code, budget)
+    if len(spans) == 1:
+        if digest is None:
+            return [(code, PROMPT_TEMPLATE)], None
+        return [(compact_text(digest, code), COMPACT_TEMPLATE)], None
+
+    def combine(summaries):
+        text = combine_sections(summaries)
+        if digest is not None:
+            text = f"Module digest:\n{digest}\n\n{text}"
+        return text, COMBINE_TEMPLATE
+
+    return [(text, SECTION_TEMPLATE) for text in chunker.segment_texts(code, spans)], combine
+
+
+def _size(prompts):
+    return sum(estimate_tokens(template.format(code=text)) for text, template in prompts)
+
+
+def plan_prompts(code, max_tokens=None, parsed=None):
+    """Prompts for summarizing one module.
+
+    Returns ``(mode, prompts, combine)``. ``prompts`` is a list of ``(text,
+    template)`` pairs for the first round. ``combine`` is None when that
+    round is a single prompt. Otherwise it maps the section summaries to
+    the ``(text, template)`` of the combining prompt. Compact mode needs
+    ``parsed`` from parse_verilog_code. The full code is sent instead when
+    the parse failed or when the digest would not make the prompt smaller,
+    as happens for small modules.
+    """
+    prompts, combine = _plan(code, max_tokens, None)
+    if parsed is None or parsed[0] is None:
+        return "full", prompts, combine
+    compact_prompts, compact_combine = _plan(compact_code(code), max_tokens, module_digest(*parsed[:6]))
+    if _size(compact_prompts) >= _size(prompts):
+        return "full", prompts, combine
+    return "compact", compact_prompts, compact_combine
@@ -0,0 +1,213 @@
+import argparse
+import json
+import urllib.parse
+
+import numpy as np
+
+EDGE_TYPES = ('uses_signal', 'produces_signal')
+
+
+class ConnectivityBuilder:
+    def __init__(self):
+        self.node_ids = {}
+        self.names = []
+        self.kinds = []
+        self.src = []
+        self.dst = []
+
+    def _node(self, name, kind):
+        node = self.node_ids.get(name)
+        if node is None:
+            node = self.node_ids[name] = len(self.names)
+            self.names.append(name)
+            self.kinds.append(kind)
+        return node
+
+    def add_module(self, module_name, relationships):
+        # Edges follow data flow: operand signal -> operation -> produced signal
+        for rel in relationships:
+            if rel['type'] not in EDGE_TYPES:
+                continue
+            op = self._node(f"{module_name}.{rel['source']}", 'operation')
+            signal = self._node(node_name(module_name, rel['target']), 'signal')
+            if rel['type'] == 'uses_signal':
+                self.src.append(signal)
+                self.dst.append(op)
+            else:
+                self.src.append(op)
+                self.dst.append(signal)
+
+    def build(self):
+        return ConnectivityIndex.from_edges(
+            np.array(self.src, dtype=np.int64),
+            np.array(self.dst, dtype=np.int64),
+            self.names,
+            self.kinds
+        )
+
+
+def _csr(src, dst, n):
+    order = np.argsort(src, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return indptr, dst[order].astype(np.int32)
+
+
+def index_path(path):
+    # np.savez adds .npz when it is missing; save and load both go through here so they agree
+    return path if path.endswith('.npz') else f'{path}.npz'
+
+
+class ConnectivityIndex:
+    def __init__(self, out_indptr, out_indices, in_indptr, in_indices, names, is_signal):
+        self.out_indptr = out_indptr
+        self.out_indices = out_indices
+        self.in_indptr = in_indptr
+        self.in_indices = in_indices
+        self.names = names
+        self.is_signal = is_signal
+        self._ids = None
+
+    @classmethod
+    def from_edges(cls, src, dst, names, kinds):
+        n = len(names)
+        out_indptr, out_indices = _csr(src, dst, n)
+        in_indptr, in_indices = _csr(dst, src, n)
+        is_signal = np.array([kind == 'signal' for kind in kinds], dtype=bool)
+        return cls(out_indptr, out_indices, in_indptr, in_indices, np.array(names, dtype=object), is_signal)
+
+    def save(self, path):
+        path = index_path(path)
+        np.savez_compressed(
+            path,
+            out_indptr=self.out_indptr,
+            out_indices=self.out_indices,
+            in_indptr=self.in_indptr,
+            in_indices=self.in_indices,
+            names=np.array(self.names, dtype=str),
+            is_signal=self.is_signal
+        )
+        return path
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(index_path(path))
+        return cls(
+            data['out_indptr'], data['out_indices'], data['in_indptr'], data['in_indices'],
+            data['names'].astype(object), data['is_signal']
+        )
+
+    @property
+    def num_nodes(self):
+        return len(self.names)
+
+    @property
+    def num_edges(self):
+        return len(self.out_indices)
+
+    def node_id(self, name):
+        if self._ids is None:
+            self._ids = {str(node): i for i, node in enumerate(self.names)}
+        return self._ids[name]
+
+    def _traverse(self, starts, indptr, indices, depth=None):
+        visited = np.zeros(self.num_nodes, dtype=bool)
+        # Start nodes only count once an edge leads back to them, e.g. a register in a feedback loop
+        reached = np.zeros(self.num_nodes, dtype=bool)
+        frontier = np.unique(np.asarray(starts, dtype=np.int64))
+        visited[frontier] = True
+        level = 0
+        # Expand a whole frontier per step with vectorized CSR gathers
+        while frontier.size and (depth is None or level < depth):
+            begins = indptr[frontier]
+            counts = indptr[frontier + 1] - begins
+            total = int(counts.sum())
+            if total == 0:
+                break
+            offsets = np.repeat(begins - np.cumsum(counts) + counts, counts) + np.arange(total)
+            neighbours = indices[offsets]
+            reached[neighbours] = True
+            neighbours = np.unique(neighbours[~visited[neighbours]])
+            visited[neighbours] = True
+            frontier = neighbours
+            level += 1
+        return np.flatnonzero(reached)
+
+    def _signals(self, nodes):
+        return [str(name) for name in self.names[nodes[self.is_signal[nodes]]]]
+
+    def fan_in(self, name, depth=None):
+        # One signal-to-signal hop crosses an operation, i.e. two graph edges
+        node_depth = None if depth is None else 2 * depth
+        return self._signals(self._traverse([self.node_id(name)], self.in_indptr, self.in_indices, node_depth))
+
+    def fan_out(self, name, depth=None):
+        node_depth = None if depth is None else 2 * depth
+        return self._signals(self._traverse([self.node_id(name)], self.out_indptr, self.out_indices, node_depth))
+
+    def cone_of_influence(self, names):
+        starts = [self.node_id(name) for name in names]
+        return self._signals(self._traverse(starts, self.in_indptr, self.in_indices))
+
+
+def node_name(module_name, target):
+    if target.startswith('signal_'):
+        return f"{module_name}.{urllib.parse.unquote(target[len('signal_'):])}"
+    return f"{module_name}.{target}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Query signal fan-in, fan-out and cone of influence from a connectivity index."
+    )
+
+    parser.add_argument(
+        "--index",
+        required=True,
+        help="Path to the .npz connectivity index."
+    )
+
+    parser.add_argument(
+        "query",
+        choices=["fanin", "fanout", "coi", "stats"],
+        help="Query to run."
+    )
+
+    parser.add_argument(
+        "signals",
+        nargs="*",
+        help="Signals as module.signal (e.g. top.clk)."
+    )
+
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=None,
+        help="Limit fan-in/fan-out to this many signal hops (default: transitive)."
+    )
+
+    args = parser.parse_args()
+
+    index = ConnectivityIndex.load(args.index)
+    if args.query == "stats":
+        print(json.dumps({'nodes': index.num_nodes, 'edges': index.num_edges}))
+        return
+
+    if not args.signals:
+        parser.error("at least one signal is required")
+    for signal in args.signals:
+        try:
+            index.node_id(signal)
+        except KeyError:
+            parser.error(f"unknown signal: {signal}")
+    if args.query == "fanin":
+        result = {signal: index.fan_in(signal, args.depth) for signal in args.signals}
+    elif args.query == "fanout":
+        result = {signal: index.fan_out(signal, args.depth) for signal in args.signals}
+    else:
+        result = index.cone_of_influence(args.signals)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
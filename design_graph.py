@@ -0,0 +1,187 @@
+import argparse
+import gzip
+import hashlib
+import logging
+import os
+
+from rdflib import Literal, RDF, RDFS
+
+import extract
+from extract import EX, quote_name
+
+logger = logging.getLogger(__name__)
+
+HIERARCHY_GRAPH = EX['graph_hierarchy']
+MANIFEST_GRAPH = EX['graph_manifest']
+
+
+def module_graph(module_name):
+    return EX[f"graph_{quote_name(module_name)}"]
+
+
+class DesignGraphBuilder:
+    def __init__(self, output_file, fmt='nq'):
+        if fmt.split('.')[0] != 'nq':
+            raise ValueError("The design graph needs N-Quads output (nq or nq.gz)")
+        self.output_file = output_file
+        self.fmt = fmt
+        self.writer = extract.TripleWriter(output_file, fmt)
+        self.defined = {}
+        self.instances = []
+        self.fingerprints = {}
+
+    def add_module(self, module_name, input_ports, output_ports, signals, parameters, operations, source=None):
+        if not module_name:
+            return
+        if module_name in self.defined:
+            logger.warning(f'Module {module_name} defined in both {self.defined[module_name]} and {source}')
+
+        modules, signal_dict, param_dict, operation_dict, relationships = extract.extract_entities(
+            module_name, input_ports, output_ports, signals, parameters, operations, scope=module_name
+        )
+        triples = extract.iter_module_triples(
+            modules, signal_dict, param_dict, operation_dict, relationships, scope=module_name
+        )
+        graph = module_graph(module_name)
+        self.writer.write(triples, graph=graph)
+        if source is not None:
+            self.writer.write([(EX[f"module_{quote_name(module_name)}"], EX.sourceFile, Literal(source))], graph=graph)
+
+        self.defined[module_name] = source
+        fingerprint = extract.module_fingerprint(
+            module_name, input_ports, output_ports, signals, parameters, operations
+        )
+        self.fingerprints[str(graph)] = hashlib.sha256(f'{fingerprint}\x1f{source}'.encode('utf-8')).hexdigest()
+        for op in operations:
+            if op['type'] == 'INSTANTIATION':
+                self.instances.append((module_name, op['target'], op['expression'].split('(')[0]))
+
+    def iter_hierarchy_triples(self):
+        yield (EX.Instance, RDF.type, RDFS.Class)
+        yield (EX.UndefinedModule, RDF.type, RDFS.Class)
+        for parent, instance, module_type in self.instances:
+            parent_uri = EX[f"module_{quote_name(parent)}"]
+            child_uri = EX[f"module_{quote_name(module_type)}"]
+            instance_uri = EX[extract.local_name('instance', instance, parent)]
+            yield (instance_uri, RDF.type, EX.Instance)
+            yield (instance_uri, RDFS.label, Literal(instance))
+            yield (instance_uri, EX.instanceOf, child_uri)
+            yield (parent_uri, EX.hasInstance, instance_uri)
+            # Instantiations of modules that no row defines stay visible as such
+            if module_type not in self.defined:
+                yield (child_uri, RDF.type, EX.UndefinedModule)
+                yield (child_uri, RDFS.label, Literal(module_type))
+
+    def close(self):
+        self.writer.write(self.iter_hierarchy_triples(), graph=HIERARCHY_GRAPH)
+        self.writer.close()
+        resolved = sum(1 for _, _, module_type in self.instances if module_type in self.defined)
+        logger.info(f'Design graph saved to {self.output_file}: {len(self.defined)} modules, '
+                    f'{resolved}/{len(self.instances)} instances resolved')
+
+
+def open_store(store_path):
+    try:
+        import pyoxigraph
+    except ImportError:
+        raise ImportError("A persistent design store needs pyoxigraph (pip install pyoxigraph)")
+    return pyoxigraph, pyoxigraph.Store(store_path)
+
+
+def write_manifest(pyoxigraph, store, fingerprints):
+    manifest = pyoxigraph.NamedNode(str(MANIFEST_GRAPH))
+    store.remove_graph(manifest)
+    content_hash = pyoxigraph.NamedNode(str(EX.contentHash))
+    store.extend(
+        pyoxigraph.Quad(pyoxigraph.NamedNode(graph), content_hash, pyoxigraph.Literal(digest), manifest)
+        for graph, digest in fingerprints.items()
+    )
+
+
+def read_manifest(pyoxigraph, store):
+    manifest = pyoxigraph.NamedNode(str(MANIFEST_GRAPH))
+    content_hash = pyoxigraph.NamedNode(str(EX.contentHash))
+    return {
+        quad.subject.value: quad.object.value
+        for quad in store.quads_for_pattern(None, content_hash, None, manifest)
+    }
+
+
+def load_into_store(nq_file, store_path, fingerprints=None):
+    pyoxigraph, store = open_store(store_path)
+    store.clear()
+    opener = gzip.open if nq_file.endswith('.gz') else open
+    with opener(nq_file, 'rb') as f:
+        store.bulk_load(f, pyoxigraph.RdfFormat.N_QUADS)
+    if fingerprints is not None:
+        write_manifest(pyoxigraph, store, fingerprints)
+    store.flush()
+    logger.info(f'Design store loaded into {store_path}')
+    return store
+
+
+def update_store(nq_file, store_path, fingerprints):
+    # Only module graphs whose content hash changed are dropped and reloaded
+    pyoxigraph, store = open_store(store_path)
+    previous = read_manifest(pyoxigraph, store)
+    fixed = {str(HIERARCHY_GRAPH), str(MANIFEST_GRAPH)}
+    for graph in list(store.named_graphs()):
+        name = graph.value
+        if name not in fixed and previous.get(name) != fingerprints.get(name):
+            store.remove_graph(graph)
+    changed = {name for name, digest in fingerprints.items() if previous.get(name) != digest}
+    changed.add(str(HIERARCHY_GRAPH))
+    store.remove_graph(pyoxigraph.NamedNode(str(HIERARCHY_GRAPH)))
+
+    opener = gzip.open if nq_file.endswith('.gz') else open
+    with opener(nq_file, 'rb') as f:
+        store.extend(
+            quad for quad in pyoxigraph.parse(f, pyoxigraph.RdfFormat.N_QUADS)
+            if isinstance(quad.graph_name, pyoxigraph.DefaultGraph) or quad.graph_name.value in changed
+        )
+    write_manifest(pyoxigraph, store, fingerprints)
+    store.flush()
+    logger.info(f'Design store updated at {store_path}: {len(changed) - 1} of {len(fingerprints)} modules reloaded')
+    return store
+
+
+def query_store(store_path, sparql):
+    _, store = open_store(store_path)
+    return store.query(sparql, use_default_graph_as_union=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Query the persistent design-level knowledge graph."
+    )
+
+    parser.add_argument(
+        "--store",
+        required=True,
+        help="Path to the design store directory."
+    )
+
+    parser.add_argument(
+        "query",
+        help="SPARQL query, or @file to read it from a file."
+    )
+
+    args = parser.parse_args()
+
+    sparql = args.query
+    if sparql.startswith("@") and os.path.exists(sparql[1:]):
+        with open(sparql[1:]) as f:
+            sparql = f.read()
+
+    results = query_store(args.store, sparql)
+    if hasattr(results, 'variables'):
+        print('\t'.join(str(v) for v in results.variables))
+        for solution in results:
+            print('\t'.join(str(value) if value is not None else '' for value in solution))
+    else:
+        for item in results:
+            print(item)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+
+import numpy as np
+
+import instrument
+import transport
+from summarizer import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAIEmbedder:
+    name = "openai"
+
+    def __init__(self, model='text-embedding-3-small', dim=1536, client=None, timeout=60.0, retry_policy=None):
+        self.model = model
+        self.dim = dim
+        self.timeout = timeout
+        self.retry_policy = retry_policy or transport.RetryPolicy()
+        self.breaker = transport.get_breaker('openai-embeddings')
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            import openai
+            self._client = openai.OpenAI(
+                timeout=self.timeout, max_retries=0, http_client=transport.http_client(openai.DefaultHttpxClient)
+            )
+        return self._client
+
+    def embed(self, texts):
+        # The API returns the model's native size unless asked; the collection is built for self.dim
+        response = transport.call_with_retry(
+            lambda: self.client.embeddings.create(input=texts, model=self.model, dimensions=self.dim),
+            self.retry_policy, self.breaker, 'embed'
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
+# Rejections of the input itself; a smaller batch without the offending item can succeed
+ITEM_ERROR_STATUS = {400, 413, 422}
+ITEM_ERROR_RE = re.compile(r'too long|maximum context length|too many tokens', re.IGNORECASE)
+
+
+def is_item_error(exc):
+    code = transport.status_code(exc)
+    if code is not None:
+        return code in ITEM_ERROR_STATUS
+    return bool(ITEM_ERROR_RE.search(str(exc)))
+
+
+class FakeEmbeddingError(RuntimeError):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FakeEmbedder:
+    name = "fake"
+
+    def __init__(self, dim=1536, latency=0.0, per_item_latency=0.0, fail_on=None, fail_rate=0.0, seed=0):
+        self.dim = dim
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.fail_on = fail_on or (lambda text: False)
+        self.fail_rate = fail_rate
+        self.calls = 0
+        self.items = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def embed(self, texts):
+        with self._lock:
+            self.calls += 1
+            self.items += len(texts)
+            flaky = self._random.random() < self.fail_rate
+        time.sleep(self.latency + self.per_item_latency * len(texts))
+        if any(self.fail_on(text) for text in texts):
+            raise FakeEmbeddingError("fake embedding failure: input rejected", 400)
+        if flaky:
+            raise FakeEmbeddingError("fake embedding failure: service unavailable", 503)
+        return [self._vector(text) for text in texts]
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'big')
+        rng = random.Random(seed)
+        return [rng.uniform(-1, 1) for _ in range(self.dim)]
+
+
+class HashingEmbedder:
+    """Local CPU embedder: signed feature hashing of identifier unigrams and bigrams.
+
+    Vectors use sublinear term frequency and are L2-normalized. No corpus
+    statistics are kept, so the same text always maps to the same vector.
+    """
+    name = "hashing"
+    model = "hashing-ngram"
+    token_re = re.compile(r"[A-Za-z_][\w$]*|\d+'[bdhoBDHO][\w]+|\d+|<=|>=|==|!=|&&|\|\||<<|>>|[^\s\w]")
+
+    def __init__(self, dim=1024, ngrams=2):
+        self.dim = dim
+        self.ngrams = ngrams
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def _hash(self, feature):
+        value = self._hashes.get(feature)
+        if value is None:
+            value = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+            with self._lock:
+                self._hashes[feature] = value
+        return value
+
+    def _token_hashes(self, text):
+        tokens = self.token_re.findall(text.lower())
+        unigrams = np.fromiter((self._hash(token) for token in tokens), dtype=np.uint64, count=len(tokens))
+        grams = [unigrams]
+        # Higher n-grams combine token hashes arithmetically instead of hashing joined strings
+        combined = unigrams
+        for n in range(2, self.ngrams + 1):
+            combined = combined[:-1] * np.uint64(0x9E3779B97F4A7C15) ^ unigrams[n - 1:]
+            combined = (combined ^ (combined >> np.uint64(31))) * np.uint64(0xBF58476D1CE4E5B9)
+            grams.append(combined)
+        return np.concatenate(grams)
+
+    def embed(self, texts):
+        hashes = [self._token_hashes(text) for text in texts]
+        rows = np.repeat(np.arange(len(texts)), [len(h) for h in hashes])
+        hashes = np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64)
+
+        # Bucket and sign both come from the same 64-bit hash
+        columns = (hashes % np.uint64(self.dim)).astype(np.int64)
+        signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+        counts = np.bincount(rows * self.dim + columns, weights=signs, minlength=len(texts) * self.dim)
+        counts = counts.reshape(len(texts), self.dim)
+
+        vectors = np.sign(counts) * np.log1p(np.abs(counts))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+        return vectors.tolist()
+
+
+EMBEDDERS = {
+    "openai": OpenAIEmbedder,
+    "hashing": HashingEmbedder,
+}
+
+
+def get_embedder(name, dim=None):
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unsupported embedder: {name}")
+    return EMBEDDERS[name]() if dim is None else EMBEDDERS[name](dim=dim)
+
+
+def collection_metadata(embedder):
+    return {
+        'embedder': embedder.name,
+        'embedding_model': getattr(embedder, 'model', embedder.name),
+        'embedding_dim': embedder.dim
+    }
+
+
+def pack_batches(texts, max_tokens=250000, max_items=256):
+    batch = []
+    batch_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if batch and (len(batch) >= max_items or batch_tokens + tokens > max_tokens):
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def embed_in_batches(texts, embedder, max_tokens=250000, max_items=256):
+    """Embeds ``texts`` in packed batches; returns vectors in input order.
+
+    A batch rejected for its input is split until the offending items are
+    isolated. Failed items get None, which callers store as zero vectors.
+    Other failures, which the embedder has already retried, give the whole
+    batch None without re-sending it. An open circuit is raised, since
+    every later batch would fail the same way.
+    """
+    vectors = [None] * len(texts)
+
+    def run(indices):
+        try:
+            with instrument.span('embed.batch', items=len(indices)):
+                result = embedder.embed([texts[i] for i in indices])
+        except transport.CircuitOpenError:
+            raise
+        except Exception as e:
+            if is_item_error(e) and len(indices) > 1:
+                mid = len(indices) // 2
+                run(indices[:mid])
+                run(indices[mid:])
+                return
+            logger.error(f'Error generating embeddings for {len(indices)} items: {str(e)}')
+            instrument.count('embed.failed', len(indices))
+            return
+        for i, vector in zip(indices, result):
+            vectors[i] = vector
+        instrument.count('embed.items', len(indices))
+
+    for batch in pack_batches(texts, max_tokens, max_items):
+        run(batch)
+    return vectors
@@ -1,8 +1,43 @@
 from rdflib import Graph, Literal, RDF, RDFS, Namespace
+from functools import lru_cache
+import gzip
+import hashlib
+import json
+import logging
 import urllib.parse
 import re
+import instrument
 
-def extract_entities(module_name, input_ports, output_ports, signals, parameters, operations, ast=None):
+logger = logging.getLogger(__name__)
+
+IDENTIFIER_RE = re.compile(r"(?<![\w'])[A-Za-z_][\w$]*")
+BIT_RANGE_RE = re.compile(r'\[\d+:\d+\]')
+
+@lru_cache(maxsize=65536)
+def quote_name(name):
+    return urllib.parse.quote(name)
+
+@lru_cache(maxsize=65536)
+def strip_range(name):
+    return BIT_RANGE_RE.sub('', name)
+
+def local_name(kind, name, scope=None):
+    # Scoped names keep signals of different modules apart in a merged design graph
+    if scope is None:
+        return f"{kind}_{quote_name(name)}"
+    return f"{kind}_{quote_name(scope)}.{quote_name(name)}"
+
+def referenced_names(text, index):
+    # Whole identifiers only, so a parameter W does not match inside WIDTH
+    names = {name for name in IDENTIFIER_RE.findall(text) if name in index}
+    return sorted(names, key=index.__getitem__)
+
+def module_fingerprint(module_name, input_ports, output_ports, signals, parameters, operations):
+    # Stable operation IDs make this a pure function of the parsed RTL
+    payload = json.dumps([module_name, input_ports, output_ports, signals, parameters, operations], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def extract_entities(module_name, input_ports, output_ports, signals, parameters, operations, ast=None, scope=None):
     modules = [{
         'name': module_name,
         'input_ports': [{'name': name, 'direction': 'input', 'width': width} for name, width in input_ports],
@@ -37,127 +72,195 @@ def extract_entities(module_name, input_ports, output_ports, signals, parameters
     } for op in operations}
     
     relationships = []
+    param_index = {name: i for i, name in enumerate(param_dict)}
     for op in operations:
-        op_id = op['id']
+        op_uri = local_name('operation', op['id'], scope)
         for operand in op['operands']:
-            operand_clean = re.sub(r'\[\d+:\d+\]', '', operand)
+            operand_clean = strip_range(operand)
             if operand_clean in signal_dict:
                 relationships.append({
-                    'source': f"operation_{urllib.parse.quote(op_id)}",
-                    'target': f"signal_{urllib.parse.quote(operand_clean)}",
+                    'source': op_uri,
+                    'target': local_name('signal', operand_clean, scope),
                     'type': 'uses_signal'
                 })
-        target_clean = re.sub(r'\[\d+:\d+\]', '', op['target'])
+        target_clean = strip_range(op['target'])
         if target_clean in signal_dict:
             relationships.append({
-                'source': f"operation_{urllib.parse.quote(op_id)}",
-                'target': f"signal_{urllib.parse.quote(target_clean)}",
+                'source': op_uri,
+                'target': local_name('signal', target_clean, scope),
                 'type': 'produces_signal'
             })
-        for param_name in param_dict:
-            if param_name in op['expression']:
-                relationships.append({
-                    'source': f"operation_{urllib.parse.quote(op_id)}",
-                    'target': f"param_{urllib.parse.quote(param_name)}",
-                    'type': 'depends_on_parameter'
-                })
+        for param_name in referenced_names(op['expression'], param_index):
+            relationships.append({
+                'source': op_uri,
+                'target': local_name('param', param_name, scope),
+                'type': 'depends_on_parameter'
+            })
         if op['type'] == 'INSTANTIATION':
             module_type = op['expression'].split('(')[0]
             relationships.append({
-                'source': f"module_{urllib.parse.quote(module_name)}",
-                'target': f"module_{urllib.parse.quote(module_type)}",
+                'source': f"module_{quote_name(module_name)}",
+                'target': f"module_{quote_name(module_type)}",
                 'type': 'instantiates'
             })
 
-    for signal_name, signal_info in signal_dict.items():
-        for param_name in param_dict:
-            if param_name in signal_info['width']:
+    if param_index:
+        for signal_name, signal_info in signal_dict.items():
+            for param_name in referenced_names(signal_info['width'], param_index):
                 relationships.append({
-                    'source': f"signal_{urllib.parse.quote(signal_name)}",
-                    'target': f"param_{urllib.parse.quote(param_name)}",
+                    'source': local_name('signal', signal_name, scope),
+                    'target': local_name('param', param_name, scope),
                     'type': 'uses_parameter'
                 })
     return modules, signal_dict, param_dict, operation_dict, relationships
 
-def create_knowledge_graph(modules, signals, parameters, operations, relationships, output_file):
-    g = Graph()
-    EX = Namespace('http://example.org/hw#')
-    g.bind('ex', EX)
-    g.add((EX.Module, RDF.type, RDFS.Class))
-    g.add((EX.Signal, RDF.type, RDFS.Class))
-    g.add((EX.Parameter, RDF.type, RDFS.Class))
-    g.add((EX.Operation, RDF.type, RDFS.Class))
-    g.add((EX.hasInput, RDF.type, RDF.Property))
-    g.add((EX.hasOutput, RDF.type, RDF.Property))
-    g.add((EX.hasInternalSignal, RDF.type, RDF.Property))
-    g.add((EX.hasParameter, RDF.type, RDF.Property))
-    g.add((EX.performsOperation, RDF.type, RDF.Property))
-    g.add((EX.hasExpression, RDF.type, RDF.Property))
-    g.add((EX.usesSignal, RDF.type, RDF.Property))
-    g.add((EX.producesSignal, RDF.type, RDF.Property))
-    g.add((EX.dependsOnParameter, RDF.type, RDF.Property))
-    g.add((EX.usesParameter, RDF.type, RDF.Property))
-    g.add((EX.instantiates, RDF.type, RDF.Property))
+EX = Namespace('http://example.org/hw#')
+
+SCHEMA_TRIPLES = [
+    (EX.Module, RDF.type, RDFS.Class),
+    (EX.Signal, RDF.type, RDFS.Class),
+    (EX.Parameter, RDF.type, RDFS.Class),
+    (EX.Operation, RDF.type, RDFS.Class),
+    (EX.hasInput, RDF.type, RDF.Property),
+    (EX.hasOutput, RDF.type, RDF.Property),
+    (EX.hasInternalSignal, RDF.type, RDF.Property),
+    (EX.hasParameter, RDF.type, RDF.Property),
+    (EX.performsOperation, RDF.type, RDF.Property),
+    (EX.hasExpression, RDF.type, RDF.Property),
+    (EX.usesSignal, RDF.type, RDF.Property),
+    (EX.producesSignal, RDF.type, RDF.Property),
+    (EX.dependsOnParameter, RDF.type, RDF.Property),
+    (EX.usesParameter, RDF.type, RDF.Property),
+    (EX.instantiates, RDF.type, RDF.Property),
+]
 
+def iter_module_triples(modules, signals, parameters, operations, relationships, scope=None):
     for module in modules:
-        module_uri = EX[f"module_{urllib.parse.quote(module['name'])}"]
-        g.add((module_uri, RDF.type, EX.Module))
-        g.add((module_uri, RDFS.label, Literal(module['name'])))
+        module_uri = EX[f"module_{quote_name(module['name'])}"]
+        yield (module_uri, RDF.type, EX.Module)
+        yield (module_uri, RDFS.label, Literal(module['name']))
 
         for port in module['input_ports']:
-            signal_uri = EX[f"signal_{urllib.parse.quote(port['name'])}"]
-            g.add((signal_uri, RDF.type, EX.Signal))
-            g.add((signal_uri, RDFS.label, Literal(port['name'])))
-            g.add((signal_uri, EX.width, Literal(port['width'])))
-            g.add((signal_uri, EX.direction, Literal('input')))
-            g.add((module_uri, EX.hasInput, signal_uri))
+            signal_uri = EX[local_name('signal', port['name'], scope)]
+            yield (signal_uri, RDF.type, EX.Signal)
+            yield (signal_uri, RDFS.label, Literal(port['name']))
+            yield (signal_uri, EX.width, Literal(port['width']))
+            yield (signal_uri, EX.direction, Literal('input'))
+            yield (module_uri, EX.hasInput, signal_uri)
 
         for port in module['output_ports']:
-            signal_uri = EX[f"signal_{urllib.parse.quote(port['name'])}"]
-            g.add((signal_uri, RDF.type, EX.Signal))
-            g.add((signal_uri, RDFS.label, Literal(port['name'])))
-            g.add((signal_uri, EX.width, Literal(port['width'])))
-            g.add((signal_uri, EX.direction, Literal('output')))
-            g.add((module_uri, EX.hasOutput, signal_uri))
+            signal_uri = EX[local_name('signal', port['name'], scope)]
+            yield (signal_uri, RDF.type, EX.Signal)
+            yield (signal_uri, RDFS.label, Literal(port['name']))
+            yield (signal_uri, EX.width, Literal(port['width']))
+            yield (signal_uri, EX.direction, Literal('output'))
+            yield (module_uri, EX.hasOutput, signal_uri)
 
         for signal_name, signal_info in signals.items():
             if signal_info['module'] == module['name'] and signal_info['direction'] == 'internal':
-                signal_uri = EX[f"signal_{urllib.parse.quote(signal_name)}"]
-                g.add((signal_uri, RDF.type, EX.Signal))
-                g.add((signal_uri, RDFS.label, Literal(signal_name)))
-                g.add((signal_uri, EX.width, Literal(signal_info['width'])))
-                g.add((signal_uri, EX.signalType, Literal(signal_info['type'])))
-                g.add((signal_uri, EX.direction, Literal('internal')))
-                g.add((module_uri, EX.hasInternalSignal, signal_uri))
+                signal_uri = EX[local_name('signal', signal_name, scope)]
+                yield (signal_uri, RDF.type, EX.Signal)
+                yield (signal_uri, RDFS.label, Literal(signal_name))
+                yield (signal_uri, EX.width, Literal(signal_info['width']))
+                yield (signal_uri, EX.signalType, Literal(signal_info['type']))
+                yield (signal_uri, EX.direction, Literal('internal'))
+                yield (module_uri, EX.hasInternalSignal, signal_uri)
 
         for param_name, param_info in parameters.items():
             if param_info['module'] == module['name']:
-                param_uri = EX[f"param_{urllib.parse.quote(param_name)}"]
-                g.add((param_uri, RDF.type, EX.Parameter))
-                g.add((param_uri, RDFS.label, Literal(param_name)))
-                g.add((param_uri, EX.value, Literal(param_info['value'])))
-                g.add((module_uri, EX.hasParameter, param_uri))
+                param_uri = EX[local_name('param', param_name, scope)]
+                yield (param_uri, RDF.type, EX.Parameter)
+                yield (param_uri, RDFS.label, Literal(param_name))
+                yield (param_uri, EX.value, Literal(param_info['value']))
+                yield (module_uri, EX.hasParameter, param_uri)
 
         for op_id, op_info in operations.items():
             if op_info['module'] == module['name']:
-                op_uri = EX[f"operation_{urllib.parse.quote(op_id)}"]
-                g.add((op_uri, RDF.type, EX.Operation))
-                g.add((op_uri, RDFS.label, Literal(op_info['type'])))
-                g.add((op_uri, EX.target, Literal(op_info['target'])))
-                g.add((op_uri, EX.hasExpression, Literal(op_info['expression'])))
-                g.add((op_uri, EX.context, Literal(op_info['context'])))
+                op_uri = EX[local_name('operation', op_id, scope)]
+                yield (op_uri, RDF.type, EX.Operation)
+                yield (op_uri, RDFS.label, Literal(op_info['type']))
+                yield (op_uri, EX.target, Literal(op_info['target']))
+                yield (op_uri, EX.hasExpression, Literal(op_info['expression']))
+                yield (op_uri, EX.context, Literal(op_info['context']))
                 for operand in op_info['operands']:
-                    operand_clean = re.sub(r'\[\d+:\d+\]', '', operand)
+                    operand_clean = strip_range(operand)
                     if operand_clean in signals:
-                        signal_uri = EX[f"signal_{urllib.parse.quote(operand_clean)}"]
-                        g.add((op_uri, EX.usesSignal, signal_uri))
-                g.add((module_uri, EX.performsOperation, op_uri))
+                        signal_uri = EX[local_name('signal', operand_clean, scope)]
+                        yield (op_uri, EX.usesSignal, signal_uri)
+                yield (module_uri, EX.performsOperation, op_uri)
 
     for rel in relationships:
         source_uri = EX[rel['source']]
         target_uri = EX[rel['target']]
         rel_type = EX[rel['type'].replace('_', '')]
-        g.add((source_uri, rel_type, target_uri))
+        yield (source_uri, rel_type, target_uri)
+
+KG_FORMATS = ['ttl', 'nt', 'nq', 'nt.gz', 'nq.gz']
+
+def _nt_literal(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+def nt_term(term):
+    if isinstance(term, Literal):
+        text = f'"{_nt_literal(str(term))}"'
+        if term.language:
+            return f'{text}@{term.language}'
+        if term.datatype:
+            return f'{text}^^<{term.datatype}>'
+        return text
+    return f'<{term}>'
+
+class TripleWriter:
+    def __init__(self, output_file, fmt='nt', graph=None):
+        self.quads = fmt.split('.')[0] == 'nq'
+        self.graph = graph
+        self.count = 0
+        if fmt.endswith('.gz'):
+            self._out = gzip.open(output_file, 'wt', encoding='utf-8', compresslevel=6)
+        else:
+            self._out = open(output_file, 'w', encoding='utf-8')
+        # Schema goes out once per file, not once per module
+        self.write(SCHEMA_TRIPLES, graph=None)
+
+    def write(self, triples, graph=...):
+        graph = self.graph if graph is ... else graph
+        suffix = f' {nt_term(graph)} .\n' if self.quads and graph is not None else ' .\n'
+        seen = set()
+        for s, p, o in triples:
+            line = f'{nt_term(s)} {nt_term(p)} {nt_term(o)}{suffix}'
+            if line in seen:
+                continue
+            seen.add(line)
+            self._out.write(line)
+        self.count += len(seen)
+
+    def close(self):
+        self._out.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
-    g.serialize(destination=output_file, format='turtle')
-    print(f'Knowledge graph saved to {output_file}')
\ No newline at end of file
+def create_knowledge_graph(modules, signals, parameters, operations, relationships, output_file, fmt='ttl'):
+    with instrument.span('kg.write', format=fmt) as span_args:
+        triples = iter_module_triples(modules, signals, parameters, operations, relationships)
+        if fmt == 'ttl':
+            g = Graph()
+            g.bind('ex', EX)
+            for triple in SCHEMA_TRIPLES:
+                g.add(triple)
+            for triple in triples:
+                g.add(triple)
+            g.serialize(destination=output_file, format='turtle')
+            count = len(g)
+        else:
+            graph = EX[f"graph_{quote_name(modules[0]['name'])}"] if modules and modules[0]['name'] else None
+            with TripleWriter(output_file, fmt, graph=graph) as writer:
+                writer.write(triples)
+            count = writer.count
+        span_args['triples'] = count
+    instrument.count('kg.triples', count)
+    logger.debug(f'Knowledge graph saved to {output_file}')
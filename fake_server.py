@@ -0,0 +1,208 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from summarizer import estimate_tokens
+
+
+class FaultConfig:
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit_rate=0.0, retry_after=1.0, error_rate=0.0,
+                 hang_rate=0.0, hang=30.0, fail_first=0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang = hang
+        self.fail_first = fail_first
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'connections': 0, 'statuses': {}, 'hangs': 0}
+
+    def draw(self):
+        # Returns (delay, status) for the next request
+        with self._lock:
+            self.stats['requests'] += 1
+            n = self.stats['requests']
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            roll = self._random.random()
+        if n <= self.fail_first:
+            return delay, 503
+        if roll < self.rate_limit_rate:
+            return delay, 429
+        roll -= self.rate_limit_rate
+        if roll < self.error_rate:
+            return delay, 500
+        roll -= self.error_rate
+        if roll < self.hang_rate:
+            with self._lock:
+                self.stats['hangs'] += 1
+            return delay + self.hang, 200
+        return delay, 200
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self.stats))
+
+    def record(self, key, status=None):
+        with self._lock:
+            if status is None:
+                self.stats[key] += 1
+            else:
+                self.stats['statuses'][str(status)] = self.stats['statuses'].get(str(status), 0) + 1
+
+
+def _vector(text, dim):
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'big')
+    rng = random.Random(seed)
+    return [rng.uniform(-1, 1) for _ in range(dim)]
+
+
+def chat_response(body):
+    prompt = ''.join(message.get('content', '') for message in body.get('messages', []))
+    tokens = estimate_tokens(prompt)
+    return {
+        'id': 'chatcmpl-fake',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'fake'),
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': f'Fake summary ({tokens} prompt tokens)'},
+            'finish_reason': 'stop'
+        }],
+        'usage': {'prompt_tokens': tokens, 'completion_tokens': 8, 'total_tokens': tokens + 8}
+    }
+
+
+def messages_response(body):
+    prompt = ''.join(message.get('content', '') for message in body.get('messages', []))
+    tokens = estimate_tokens(prompt)
+    return {
+        'id': 'msg_fake',
+        'type': 'message',
+        'role': 'assistant',
+        'model': body.get('model', 'fake'),
+        'content': [{'type': 'text', 'text': f'Fake summary ({tokens} prompt tokens)'}],
+        'stop_reason': 'end_turn',
+        'usage': {'input_tokens': tokens, 'output_tokens': 8}
+    }
+
+
+def embeddings_response(body):
+    texts = body.get('input', [])
+    texts = [texts] if isinstance(texts, str) else texts
+    dim = body.get('dimensions') or 1536
+    return {
+        'object': 'list',
+        'data': [{'object': 'embedding', 'index': i, 'embedding': _vector(text, dim)} for i, text in enumerate(texts)],
+        'model': body.get('model', 'fake'),
+        'usage': {'prompt_tokens': sum(estimate_tokens(t) for t in texts), 'total_tokens': 0}
+    }
+
+
+ROUTES = {
+    '/v1/chat/completions': chat_response,
+    '/v1/messages': messages_response,
+    '/v1/embeddings': embeddings_response,
+}
+
+
+def make_handler(faults):
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1 keeps connections open, so the stats show whether clients pool them
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            super().setup()
+            faults.record('connections')
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, payload, headers=None):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client gave up on a hanging request
+                self.close_connection = True
+                return
+            faults.record('statuses', status)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._send(200, faults.snapshot())
+            else:
+                self._send(404, {'error': {'message': 'not found'}})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            route = ROUTES.get(self.path.split('?')[0])
+            if route is None:
+                self._send(404, {'error': {'message': 'not found'}})
+                return
+            delay, status = faults.draw()
+            time.sleep(delay)
+            if status == 429:
+                self._send(429, {'error': {'message': 'rate limited', 'type': 'rate_limit_error'}},
+                           {'Retry-After': f'{faults.retry_after:g}'})
+            elif status != 200:
+                self._send(status, {'error': {'message': 'injected failure', 'type': 'server_error'}})
+            else:
+                self._send(200, route(body))
+
+    return Handler
+
+
+def start_server(port=0, host='127.0.0.1', **options):
+    faults = FaultConfig(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(faults))
+    server.daemon_threads = True
+    server.faults = faults
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local OpenAI/Anthropic-compatible HTTP server that injects latency and failures."
+    )
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra uniform random delay per response.")
+    parser.add_argument("--rate_limit_rate", type=float, default=0.0, help="Fraction of requests answered 429.")
+    parser.add_argument("--retry_after", type=float, default=1.0, help="Retry-After seconds sent with 429s.")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of requests answered 500.")
+    parser.add_argument("--hang_rate", type=float, default=0.0, help="Fraction of requests held for --hang seconds.")
+    parser.add_argument("--hang", type=float, default=30.0, help="Seconds a hanging request is held.")
+    parser.add_argument("--fail_first", type=int, default=0, help="Answer the first N requests with 503.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for fault injection.")
+
+    args = parser.parse_args()
+
+    options = vars(args)
+    port = options.pop('port')
+    server = start_server(port, **options)
+    print(f"Serving on http://127.0.0.1:{server.server_address[1]}/v1 (stats at /stats)", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print(json.dumps(server.faults.snapshot(), indent=2))
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+class Tracer:
+    def __init__(self, max_events=None):
+        self.max_events = max_events
+        self.events = self._new_events()
+        self.counters = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def _new_events(self):
+        return [] if self.max_events is None else deque(maxlen=self.max_events)
+
+    def keep_last(self, max_events):
+        # Long-running processes keep only the most recent spans; counters still cover everything
+        with self._lock:
+            self.max_events = max_events
+            self.events = deque(self.events, maxlen=max_events)
+
+    @contextmanager
+    def span(self, name, **args):
+        # Wall-clock start keeps events from worker processes on one timeline
+        start = time.time() * 1e6
+        perf_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield args
+        finally:
+            duration = (time.perf_counter() - perf_start) * 1e6
+            self.record(name, start, duration, time.thread_time() - cpu_start, args)
+
+    def record(self, name, start_us, duration_us, cpu_seconds, args=None, pid=None, tid=None):
+        event = {
+            'name': name,
+            'ph': 'X',
+            'ts': round(start_us, 1),
+            'dur': round(duration_us, 1),
+            'pid': pid if pid is not None else os.getpid(),
+            'tid': tid if tid is not None else threading.get_ident(),
+            'args': dict(args or {}, cpu_ms=round(cpu_seconds * 1000, 3))
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def drain(self):
+        # Hands events and counters from a worker process back to the parent
+        with self._lock:
+            events, counters = list(self.events), dict(self.counters)
+            self.events = self._new_events()
+            self.counters = defaultdict(float)
+        return events, counters
+
+    def merge(self, events, counters):
+        with self._lock:
+            self.events.extend(events)
+            for name, value in counters.items():
+                self.counters[name] += value
+
+    def summary(self):
+        stages = {}
+        with self._lock:
+            events = list(self.events)
+            counters = dict(self.counters)
+        for event in events:
+            stage = stages.setdefault(event['name'], {'calls': 0, 'wall_ms': 0.0, 'cpu_ms': 0.0, 'max_ms': 0.0})
+            wall_ms = event['dur'] / 1000
+            stage['calls'] += 1
+            stage['wall_ms'] += wall_ms
+            stage['cpu_ms'] += event['args']['cpu_ms']
+            stage['max_ms'] = max(stage['max_ms'], wall_ms)
+        return stages, counters
+
+    def format_summary(self):
+        stages, counters = self.summary()
+        lines = [f"{'stage':<28}{'calls':>8}{'wall ms':>12}{'cpu ms':>12}{'mean ms':>12}{'max ms':>12}"]
+        for name, stage in sorted(stages.items(), key=lambda item: -item[1]['wall_ms']):
+            mean = stage['wall_ms'] / stage['calls']
+            lines.append(
+                f"{name:<28}{stage['calls']:>8}{stage['wall_ms']:>12.1f}{stage['cpu_ms']:>12.1f}"
+                f"{mean:>12.2f}{stage['max_ms']:>12.1f}"
+            )
+        for name, value in sorted(counters.items()):
+            lines.append(f"{name:<28}{value:>12g}")
+        return '\n'.join(lines)
+
+    def write(self, path):
+        stages, counters = self.summary()
+        with self._lock:
+            events = list(self.events)
+        if path.endswith('.jsonl'):
+            with open(path, 'w') as f:
+                for event in events:
+                    f.write(json.dumps(event) + '\n')
+                f.write(json.dumps({'name': 'summary', 'stages': stages, 'counters': counters}) + '\n')
+        else:
+            # Chrome trace format, viewable in chrome://tracing or Perfetto
+            end = max((event['ts'] + event['dur'] for event in events), default=0)
+            counter_events = [
+                {'name': name, 'ph': 'C', 'ts': end, 'pid': os.getpid(), 'args': {'value': value}}
+                for name, value in counters.items()
+            ]
+            with open(path, 'w') as f:
+                json.dump({'traceEvents': events + counter_events, 'displayTimeUnit': 'ms'}, f)
+
+
+tracer = Tracer()
+span = tracer.span
+count = tracer.count
@@ -1,187 +1,664 @@
 import argparse
+import hashlib
+import itertools
 import json
+import logging
 import os
+import random
+import threading
+import time
+from collections import Counter, namedtuple
+
 from dotenv import load_dotenv
-import parse_code
+
+import batch
+import chunker
+import compact
+import connectivity
+import design_graph
 import extract
-import chromadb
-import openai
-from google.genai import Client
-import anthropic
-from google.genai.types import HttpOptions
+import instrument
+import parse_code
+import prepare_data
+import transport
+from cache import ParseCache, SummaryCache
+from cassette import Cassette
+from checkpoint import JsonArrayWriter, Journal
+from embedding import EMBEDDERS, OpenAIEmbedder, collection_metadata, embed_in_batches, get_embedder
+from summarizer import (
+    MODELS, PROMPT_TEMPLATE, add_usage, estimate_tokens, get_rate_limiter, summarize_concurrently
+)
+
 load_dotenv()
 
-class LLMClient:
-    def __init__(self, provider):
-        self.provider = provider.lower()
+logger = logging.getLogger(__name__)
 
-        if self.provider == "openai":
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                raise ValueError("OPENAI_API_KEY missing in .env")
-            self.client = openai.OpenAI(api_key=api_key)
-
-        elif self.provider == "google-genai":
-            project = os.getenv("GOOGLE_CLOUD_PROJECT")
-            location = os.getenv("GOOGLE_CLOUD_LOCATION")
-            if not project:
-                raise ValueError("GOOGLE_API_KEY missing in .env")
-            self.client = Client(vertexai=True, project=project, location=location, http_options=HttpOptions(api_version="v1"))
-
-        elif self.provider == "anthropic":
-            api_key = os.getenv("ANTHROPIC_API_KEY")
-            if not api_key:
-                raise ValueError("ANTHROPIC_API_KEY missing in .env")
-            self.client = anthropic.Anthropic(api_key=api_key)
+CHROMA_PATH = './verilog_chroma_db'
 
-        else:
-            raise ValueError(f"Unsupported provider: {provider}")
+# Provider SDKs are imported by connect() on first use, so a run only loads the one it needs
+Provider = namedtuple('Provider', ['env', 'connect', 'complete'])
 
-    def summarize(self, code):
-        prompt = f"""
-        Provide a detailed summary of the following Verilog module,
-        including its functionality, inputs, outputs, parameters, and key operations.
-
-        Verilog Code:
-        ```verilog
-        {code}
-        ```
-
-        Summary requirements:
-        - 100-200 words
-        - Purpose of the module
-        - Inputs / outputs (with widths)
-        - Parameters
-        - Main logic / operations
-        - Notable features (FSM, sequential, etc.)
-        """
-
-        if self.provider == "openai":
-            response = self.client.chat.completions.create(
-                model="gpt-5",
-                messages=[{"role": "user", "content": prompt}],
-                #max_tokens=1000
-            )
-            return response.choices[0].message.content.strip()
 
-        elif self.provider == "google-genai":
-            response = self.client.models.generate_content(
-                model="gemini-2.5-pro",
-                contents=prompt
+def _connect_openai(timeout):
+    import openai
+    # Retries are handled by transport.call_with_retry, not inside the SDK
+    return openai.OpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"), timeout=timeout, max_retries=0,
+        http_client=transport.http_client(openai.DefaultHttpxClient)
+    )
+
+
+def _complete_openai(client, model, prompt):
+    response = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        #max_tokens=1000
+    )
+    return response.choices[0].message.content.strip()
+
+
+def _connect_google(timeout):
+    from google.genai import Client
+    from google.genai.types import HttpOptions
+    return Client(
+        vertexai=True, project=os.getenv("GOOGLE_CLOUD_PROJECT"), location=os.getenv("GOOGLE_CLOUD_LOCATION"),
+        http_options=HttpOptions(
+            api_version="v1", timeout=int(timeout * 1000), httpx_client=transport.http_client()
+        )
+    )
+
+
+def _complete_google(client, model, prompt):
+    response = client.models.generate_content(
+        model=model,
+        contents=prompt
+    )
+    return response.text.strip()
+
+
+def _connect_anthropic(timeout):
+    import anthropic
+    return anthropic.Anthropic(
+        api_key=os.getenv("ANTHROPIC_API_KEY"), timeout=timeout, max_retries=0,
+        http_client=transport.http_client(anthropic.DefaultHttpxClient)
+    )
+
+
+def _complete_anthropic(client, model, prompt):
+    response = client.messages.create(
+        model=model,
+        max_tokens=1000,
+        messages=[{"role": "user", "content": prompt}]
+    )
+    return response.content[0].text.strip()
+
+
+PROVIDERS = {
+    "openai": Provider(("OPENAI_API_KEY",), _connect_openai, _complete_openai),
+    "google-genai": Provider(("GOOGLE_CLOUD_PROJECT",), _connect_google, _complete_google),
+    "anthropic": Provider(("ANTHROPIC_API_KEY",), _connect_anthropic, _complete_anthropic),
+}
+
+
+def register_provider(name, connect, complete, env=(), model=None):
+    PROVIDERS[name] = Provider(tuple(env), connect, complete)
+    if model is not None:
+        MODELS[name] = model
+
+
+class LLMClient:
+    # A Cassette here records every live completion for later --client replay
+    recorder = None
+    # Offline clients (stub, replay) answer locally and need no SDK or API key
+    live = True
+
+    def __init__(self, provider, cache=None, rate_limiter=None, timeout=60.0, retry_policy=None):
+        self.provider = provider.lower()
+        self.model = MODELS.get(self.provider)
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.retry_policy = retry_policy or transport.RetryPolicy()
+        self.breaker = transport.get_breaker(self.provider)
+        self._client = None
+        self._client_lock = threading.Lock()
+        if not self.live:
+            return
+
+        if self.provider not in PROVIDERS:
+            raise ValueError(f"Unsupported provider: {provider}")
+        # Credentials are checked up front even though the SDK loads later
+        for var in PROVIDERS[self.provider].env:
+            if not os.getenv(var):
+                raise ValueError(f"{var} missing in .env")
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                self._client = PROVIDERS[self.provider].connect(self.timeout)
+            return self._client
+
+    def summarize(self, code, template=PROMPT_TEMPLATE, usage=None):
+        prompt = template.format(code=code)
+        prompt_tokens = estimate_tokens(prompt)
+        if self.cache is not None:
+            cached = self.cache.get_summary(code, self.provider, self.model, template)
+            if cached is not None:
+                instrument.count('cache.summary.hits')
+                if usage is not None:
+                    add_usage(usage, prompt_tokens, estimate_tokens(cached))
+                return cached
+            instrument.count('cache.summary.misses')
+
+        if self.rate_limiter is not None:
+            with instrument.span('llm.rate_limit_wait'):
+                self.rate_limiter.acquire(prompt_tokens)
+        with instrument.span('llm.request', provider=self.provider, prompt_tokens=prompt_tokens) as span_args:
+            start = time.perf_counter()
+            summary = transport.call_with_retry(
+                lambda: self._complete(prompt), self.retry_policy, self.breaker, 'llm'
             )
-            return response.text.strip()
+            if self.recorder is not None:
+                self.recorder.record(prompt, summary, time.perf_counter() - start, self.provider, self.model, prompt_tokens)
+            span_args['completion_tokens'] = estimate_tokens(summary)
+        instrument.count('llm.requests')
+        instrument.count('llm.prompt_tokens', prompt_tokens)
+        instrument.count('llm.completion_tokens', span_args['completion_tokens'])
+        if usage is not None:
+            add_usage(usage, prompt_tokens, span_args['completion_tokens'], time.perf_counter() - start)
+
+        if self.cache is not None:
+            self.cache.set_summary(code, self.provider, self.model, template, summary)
+        return summary
+
+    def summarize_module(self, code, max_tokens=None, parsed=None, usage=None):
+        # Modules over the budget are summarized per section, then the summaries are combined
+        mode, prompts, combine = compact.plan_prompts(code, max_tokens, parsed)
+        if usage is not None:
+            usage['prompt_mode'] = mode
+        summaries = [self.summarize(text, template, usage) for text, template in prompts]
+        if combine is None:
+            return summaries[0]
+        return self.summarize(*combine(summaries), usage=usage)
+
+    def _complete(self, prompt):
+        return PROVIDERS[self.provider].complete(self.client, self.model, prompt)
+
+
+class StubLLMClient(LLMClient):
+    live = False
+
+    def __init__(self, latency=0.5, jitter=0.0, cache=None, rate_limiter=None, seed=0):
+        super().__init__("stub", cache=cache, rate_limiter=rate_limiter)
+        self.model = "stub"
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _complete(self, prompt):
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        time.sleep(delay)
+        return f"Stub summary ({estimate_tokens(prompt)} prompt tokens)"
+
+
+class ReplayLLMClient(LLMClient):
+    live = False
+
+    def __init__(self, cassette, latency=None, jitter=0.0, cache=None, rate_limiter=None, seed=0):
+        super().__init__("replay", cache=cache, rate_limiter=rate_limiter)
+        self.cassette = cassette
+        models = {entry['model'] for entry in cassette.entries.values()}
+        self.model = models.pop() if len(models) == 1 else "replay"
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _complete(self, prompt):
+        entry = self.cassette.lookup(prompt)
+        # Without a fixed latency each response takes as long as it did when recorded
+        with self._lock:
+            delay = (entry['latency'] if self.latency is None else self.latency) + self._random.uniform(0, self.jitter)
+        time.sleep(delay)
+        return entry['completion']
+
+
+def make_llm_client(client, cache=None, rpm=None, tpm=None, timeout=60.0, max_retries=5, stub_latency=0.5,
+                    cassette=None, record=None, replay_latency=None, replay_jitter=0.0):
+    rate_limiter = get_rate_limiter(client, rpm, tpm)
+    if client == "stub":
+        llm_client = StubLLMClient(stub_latency, cache=cache, rate_limiter=rate_limiter)
+    elif client == "replay":
+        llm_client = ReplayLLMClient(
+            Cassette(cassette), replay_latency, replay_jitter,
+            cache=cache, rate_limiter=rate_limiter
+        )
+    else:
+        llm_client = LLMClient(
+            client, cache=cache, rate_limiter=rate_limiter, timeout=timeout,
+            retry_policy=transport.RetryPolicy(max_retries)
+        )
+    if record:
+        llm_client.recorder = Cassette(record)
+    return llm_client
+
+
+def make_embedder(name, dim=None, timeout=60.0, max_retries=5):
+    embedder = get_embedder(name, dim)
+    if isinstance(embedder, OpenAIEmbedder):
+        embedder.timeout = timeout
+        embedder.retry_policy = transport.RetryPolicy(max_retries)
+    return embedder
+
+
+def chunk_document(chunk):
+    return f"Instruction: {chunk['text']}\nCode:\n{chunk['original_code']}\nSummary:\n{chunk['summary']}"
+
+def stable_chunk_id(chunk):
+    # The text only names the file, so files sharing a name in different folders need the path
+    if chunk.get('path'):
+        return chunk['path']
+    return hashlib.sha1(chunk['text'].encode('utf-8')).hexdigest()
+
+def chunk_records(chunks):
+    # Modules split by the chunker get one embedding per section
+    for chunk in chunks:
+        segments = chunk.get('segments')
+        if not segments:
+            yield chunk, None, chunk_document(chunk)
+            continue
+        texts = chunker.segment_texts(chunk['original_code'], segments)
+        for part, text in enumerate(texts):
+            document = (f"Instruction: {chunk['text']}\nCode (section {part + 1}/{len(texts)}):\n{text}"
+                        f"\nSummary:\n{chunk['summary']}")
+            yield chunk, part, document
+
+def record_id(chunk_id, part):
+    return chunk_id if part is None else f"{chunk_id}#{part}"
+
+def record_metadata(chunk, part):
+    metadata = {
+        'id': chunk['id'],
+        'source': stable_chunk_id(chunk),
+        'instruction': chunk['text'],
+        'summary': chunk['summary'],
+    }
+    if part is not None:
+        metadata['part'] = part
+        metadata['parts'] = len(chunk['segments'])
+    return metadata
+
+def chroma_client(chroma_path):
+    import chromadb
+    return chromadb.PersistentClient(path=chroma_path)
+
+def store_in_chroma(chunks, embeddings, chroma_path, collection_name='verilog_modules', embedder=None,
+                    batch_size=256):
+    embedder = embedder or OpenAIEmbedder()
+    client_ch = chroma_client(chroma_path)
+    # The new index is built beside the old one, which stays in place until the build completes
+    building = f'{collection_name}_building'
+    try:
+        client_ch.delete_collection(building)
+    except:
+        pass
+    collection = client_ch.create_collection(building, metadata=collection_metadata(embedder))
+
+    # Without precomputed embeddings, records are embedded and added a batch at a time
+    if embeddings is None:
+        pairs = (
+            pair for group in itertools.batched(chunk_records(chunks), batch_size)
+            for pair in zip(group, embed_documents([document for _, _, document in group], embedder))
+        )
+    else:
+        pairs = zip(chunk_records(chunks), embeddings)
 
-        elif self.provider == "anthropic":
-            response = self.client.messages.create(
-                model="claude-sonnet-4-5-20250929",
-                max_tokens=1000,
-                messages=[{"role": "user", "content": prompt}]
+    valid = ((record, emb) for record, emb in pairs if not all(x == 0 for x in emb))
+    try:
+        for group in itertools.batched(valid, batch_size):
+            collection.add(
+                embeddings=[emb for _, emb in group],
+                documents=[document for (_, _, document), _ in group],
+                metadatas=[record_metadata(chunk, part) for (chunk, part, _), _ in group],
+                ids=[record_id(chunk['id'], part) for (chunk, part, _), _ in group]
             )
-            return response.content[0].text.strip()
-        
-def store_in_chroma(chunks, embeddings, chroma_path, collection_name='verilog_modules'):
-    client_ch = chromadb.PersistentClient(path=chroma_path)
+    except BaseException:
+        client_ch.delete_collection(building)
+        raise
+
     try:
         client_ch.delete_collection(collection_name)
     except:
         pass
-    collection = client_ch.create_collection(collection_name)
-
-    valid_chunks = []
-    valid_embeddings = []
-    for chunk, emb in zip(chunks, embeddings):
-        if not all(x == 0 for x in emb):
-            valid_chunks.append(chunk)
-            valid_embeddings.append(emb)
-
-    if valid_chunks:
-        collection.add(
-            embeddings=[emb for emb in valid_embeddings],
-            documents=[f"Instruction: {chunk['text']}\nCode:\n{chunk['original_code']}\nSummary:\n{chunk['summary']}" for chunk in valid_chunks],
-            metadatas=[{
-                'id': chunk['id'],
-                'instruction': chunk['text'],
-                'summary': chunk['summary'],
-                #'knowledge_graph': chunk['knowledge_graph'],
-                #'module_name': chunk.get('module_name', '')
-            } for chunk in valid_chunks],
-            ids=[chunk['id'] for chunk in valid_chunks]
+    collection.modify(name=collection_name)
+    return collection
+
+def open_collection(chroma_path, embedder, collection_name='verilog_modules'):
+    collection = chroma_client(chroma_path).get_or_create_collection(
+        collection_name, metadata=collection_metadata(embedder)
+    )
+    stored = collection.metadata or {}
+    if stored.get('embedding_dim', embedder.dim) != embedder.dim or stored.get('embedder', embedder.name) != embedder.name:
+        raise ValueError(
+            f"Collection {collection_name} holds {stored.get('embedder')} vectors of dimension "
+            f"{stored.get('embedding_dim')}; rebuild it to switch to {embedder.name} ({embedder.dim})"
         )
     return collection
 
-def get_code_embedding(code):
-    try:
-        response = openai.embeddings.create(
-            input=code,
-            model='text-embedding-3-small'
+def sync_chroma(chunks, chroma_path, embedder=None, collection_name='verilog_modules', batch_size=256):
+    embedder = embedder or OpenAIEmbedder()
+    collection = open_collection(chroma_path, embedder, collection_name)
+
+    existing = {}
+    offset = 0
+    while True:
+        page = collection.get(include=['metadatas'], limit=batch_size, offset=offset)
+        for chunk_id, metadata in zip(page['ids'], page['metadatas']):
+            existing[chunk_id] = (metadata or {}).get('content_hash')
+        if len(page['ids']) < batch_size:
+            break
+        offset += batch_size
+
+    seen = set()
+    unchanged = 0
+
+    def changed_records():
+        nonlocal unchanged
+        for chunk, part, document in chunk_records(chunks):
+            chunk_id = record_id(stable_chunk_id(chunk), part)
+            if chunk_id in seen:
+                logger.warning(f"Dropping duplicate record {chunk_id} for {chunk.get('path') or chunk['text']}")
+                instrument.count('chroma.duplicates')
+                continue
+            seen.add(chunk_id)
+            content_hash = hashlib.sha256(document.encode('utf-8')).hexdigest()
+            if existing.get(chunk_id) == content_hash:
+                unchanged += 1
+                continue
+            yield chunk_id, chunk, part, document, content_hash
+
+    # Only new or modified records are embedded and written, one batch in memory at a time
+    upserted = 0
+    for group in itertools.batched(changed_records(), batch_size):
+        embeddings = embed_documents([document for _, _, _, document, _ in group], embedder)
+        upserts = [(entry, emb) for entry, emb in zip(group, embeddings) if not all(x == 0 for x in emb)]
+        if not upserts:
+            continue
+        collection.upsert(
+            ids=[entry[0] for entry, _ in upserts],
+            embeddings=[emb for _, emb in upserts],
+            documents=[entry[3] for entry, _ in upserts],
+            metadatas=[
+                dict(record_metadata(entry[1], entry[2]), content_hash=entry[4]) for entry, _ in upserts
+            ]
         )
-        return response.data[0].embedding
-    except Exception as e:
-        logging.error(f'Error generating embedding: {str(e)}')
-        return None
+        upserted += len(upserts)
+
+    removed = [chunk_id for chunk_id in existing if chunk_id not in seen]
+    for start in range(0, len(removed), batch_size):
+        collection.delete(ids=removed[start:start + batch_size])
+
+    logger.info(f'Chroma sync: {upserted} upserted, {len(removed)} deleted, {unchanged} unchanged')
+    return collection
 
-def generate_code_embeddings(code_chunks):
+def upsert_chunk(collection, chunk, embedder):
+    # Replaces one chunk's records, skipping the embedding call when none of them changed
+    records = [
+        (record_id(stable_chunk_id(chunk), part), part, document,
+         hashlib.sha256(document.encode('utf-8')).hexdigest())
+        for _, part, document in chunk_records([chunk])
+    ]
+    stored = collection.get(where={'source': stable_chunk_id(chunk)}, include=['metadatas'])
+    existing = {
+        chunk_id: (metadata or {}).get('content_hash')
+        for chunk_id, metadata in zip(stored['ids'], stored['metadatas'])
+    }
+    changed = [record for record in records if existing.get(record[0]) != record[3]]
+    stale = set(existing) - {record[0] for record in records}
+    if stale:
+        collection.delete(ids=sorted(stale))
+    if changed:
+        embeddings = embed_documents([document for _, _, document, _ in changed], embedder)
+        upserts = [(record, emb) for record, emb in zip(changed, embeddings) if not all(x == 0 for x in emb)]
+        if upserts:
+            collection.upsert(
+                ids=[record[0] for record, _ in upserts],
+                embeddings=[emb for _, emb in upserts],
+                documents=[record[2] for record, _ in upserts],
+                metadatas=[
+                    dict(record_metadata(chunk, record[1]), content_hash=record[3]) for record, _ in upserts
+                ]
+            )
+    return len(changed), len(stale)
+
+def remove_chunk(collection, source):
+    # source is a chunk's stable id (its path): the record id of an unsplit chunk, the prefix of section ids
+    collection.delete(where={'source': source})
+
+def embed_documents(texts, embedder=None):
+    embedder = embedder or OpenAIEmbedder()
     embeddings = []
-    for chunk in code_chunks:
-        text = f"Instruction: {chunk['text']}\nCode:\n{chunk['original_code']}\nSummary:\n{chunk['summary']}"
-        embedding = get_code_embedding(text)
+    for i, embedding in enumerate(embed_in_batches(texts, embedder)):
         if embedding:
             embeddings.append(embedding)
         else:
-            embeddings.append([0] * 1536)
-            print(f"Failed to generate embedding for chunk {chunk['id']}")
+            embeddings.append([0] * embedder.dim)
+            logger.warning(f"Failed to generate embedding for document {i}")
     return embeddings
 
-def process_file(input_path, output_path, kf, files, include_folder, llm_client):
-    with open(input_path, "r") as f:
-        rows = json.load(f)
-
-    chunks = []
-
-    for idx, row in enumerate(rows):
-        if not any(s in row["text"] for s in files):
-            continue
-        print(f" Working on {row["text"]}")
-        code = row["code"]
+def generate_code_embeddings(code_chunks, embedder=None):
+    # One embedding per record of chunk_records, in the same order
+    return embed_documents([document for _, _, document in chunk_records(code_chunks)], embedder)
 
-        # LLM Summary
-        summary = llm_client.summarize(code)
+def load_kg_manifest(kf):
+    path = os.path.join(kf, '.kg_manifest.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
 
-        chunks.append({
-            "id": str(idx),
-            "text": row["text"],
-            "code_line_count": len(code),
-            "original_code": code,
-            "summary": summary
-        })
+def save_kg_manifest(kf, manifest):
+    os.makedirs(kf, exist_ok=True)
+    with open(os.path.join(kf, '.kg_manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
 
-        # Parsing & Knowledge Graph
-        module_name, input_ports, output_ports, signals, parameters, operations, ast = \
-            parse_code.parse_verilog_code(code, include_folder)
+def build_knowledge_graph(idx, parsed, kf, kg_format='ttl', manifest=None):
+    module_name, input_ports, output_ports, signals, parameters, operations, ast = parsed
 
+    with instrument.span('extract.entities', module=module_name):
         modules, signals_dict, param_dict, operation_dict, relationships = \
             extract.extract_entities(
                 module_name, input_ports, output_ports, signals,
                 parameters, operations, ast
             )
 
-        os.makedirs(kf, exist_ok=True)
-        kg_file = os.path.join(kf, f"kg_{idx}.ttl")
+    os.makedirs(kf, exist_ok=True)
+    kg_file = os.path.join(kf, f"kg_{idx}.{kg_format}")
 
-        extract.create_knowledge_graph(
-            modules, signals_dict, param_dict, operation_dict, relationships, kg_file
+    # Unchanged modules keep their KG file when running incrementally
+    if manifest is not None:
+        fingerprint = extract.module_fingerprint(
+            module_name, input_ports, output_ports, signals, parameters, operations
         )
+        if manifest.get(kg_file) == fingerprint and os.path.exists(kg_file):
+            instrument.count('kg.unchanged')
+            return relationships, kg_file
+        manifest[kg_file] = fingerprint
 
-    with open(output_path, "w") as f:
-        json.dump(chunks, f, indent=2)
+    extract.create_knowledge_graph(
+        modules, signals_dict, param_dict, operation_dict, relationships, kg_file, kg_format
+    )
+    return relationships, kg_file
+
+def make_chunk(chunk_id, row, summary, chunk_tokens=6000):
+    code = row["code"]
+    chunk = {
+        "id": chunk_id,
+        "text": row["text"],
+        "code_line_count": len(code.splitlines()),
+        "original_code": code,
+        "summary": summary
+    }
+    if "path" in row:
+        chunk["path"] = row["path"]
+    spans = chunker.chunk_module(code, chunk_tokens)
+    if len(spans) > 1:
+        chunk["segments"] = [list(span) for span in spans]
+    return chunk
+
+def process_file(input_path, output_path, kf, files, include_folder, llm_client,
+                 concurrency=1, chroma_mode='rebuild', parse_workers=None, parse_cache=None,
+                 kg_format='ttl', design_graph_file=None, design_store=None,
+                 connectivity_index=None, kg_incremental=False, chunk_tokens=6000, embedder=None,
+                 batch_transport=None, batch_poll=60.0, checkpoint_path=None, resume=False, prompt_mode='full'):
+    kg_manifest = load_kg_manifest(kf) if kg_incremental else None
+    journal = Journal(checkpoint_path or f"{output_path}.journal.jsonl", resume)
+
+    # Exact filename lookups keep selection O(rows) however many files are requested
+    wanted = set(files) if files else None
+
+    def selected_rows():
+        # Rows already in the journal are neither parsed nor summarized again
+        for idx, row in enumerate(prepare_data.iter_dataset(input_path)):
+            if wanted is None or prepare_data.row_filename(row) in wanted:
+                yield idx, row, journal.completed(idx, row["code"], os.path.join(kf, f"kg_{idx}.{kg_format}"))
+
+    # The dataset is read once: the main loop and the parse/summary pipeline share one stream,
+    # and tee only buffers the rows the pipeline has read ahead
+    selected, lookahead = itertools.tee(selected_rows())
+    pending = ((idx, row) for idx, row, entry in lookahead if entry is None)
+    if resume:
+        logger.info(f'Resuming from {journal.path} ({len(journal.entries)} rows journaled)')
+
+    connectivity_builder = connectivity.ConnectivityBuilder() if connectivity_index else None
+
+    builder = None
+    if design_graph_file:
+        builder = design_graph.DesignGraphBuilder(
+            design_graph_file, 'nq.gz' if design_graph_file.endswith('.gz') else 'nq'
+        )
 
-    embeddings = generate_code_embeddings(chunks)
-    print(f'Generated embeddings for {len(embeddings)} chunks')
-    chroma_path = './verilog_chroma_db'
-    collection = store_in_chroma(chunks, embeddings, chroma_path)
-    print(f'Chroma DB saved to {chroma_path}')
+    # LLM Summary
+    if batch_transport is not None:
+        # A batch job is submitted whole, so this path holds the pending rows in memory
+        pending = list(pending)
+        parse_results = parse_code.parse_many(
+            (row["code"] for _, row in pending), include_folder, parse_workers, parse_cache
+        )
+        parsed_rows = None
+        if prompt_mode == 'compact':
+            # Compact prompts are built from parse results, which the batch needs all at once
+            parse_results = list(parse_results)
+            parsed_rows = {str(idx): parsed for (idx, _), parsed in zip(pending, parse_results)}
+            parse_results = iter(parse_results)
+        # Batch jobs finish as a whole; results are matched back to rows by id
+        usages = {}
+        results = batch.summarize_batch(
+            batch_transport, [(str(idx), row["code"]) for idx, row in pending], chunk_tokens,
+            cache=llm_client.cache, poll_interval=batch_poll, parsed=parsed_rows, usage=usages,
+            retry_policy=llm_client.retry_policy
+        )
+        # Rows whose batch request failed go through the live client rather than getting an empty summary
+        failed = [(idx, row) for idx, row in pending if str(idx) not in results]
+        if failed:
+            logger.warning(f'{len(failed)} batch rows failed; summarizing them with the {llm_client.provider} client')
+            instrument.count('batch.live_retries', len(failed))
+            retried = summarize_concurrently(
+                llm_client, [row["code"] for _, row in failed], concurrency, chunk_tokens,
+                [parsed_rows[str(idx)] for idx, _ in failed] if parsed_rows is not None else None
+            )
+            for (idx, _), (summary, usage) in zip(failed, retried):
+                results[str(idx)] = summary
+                usages[str(idx)] = usage
+        summaries = iter([(results[str(idx)], usages.get(str(idx))) for idx, _ in pending])
+    else:
+        pending_codes, parse_codes = itertools.tee(row["code"] for _, row in pending)
+        # Parsing runs in worker processes while the LLM summaries are in flight
+        parse_results = parse_code.parse_many(parse_codes, include_folder, parse_workers, parse_cache)
+        digest_inputs = None
+        if prompt_mode == 'compact':
+            # Each compact prompt waits for its module's parse; tee buffers only the rows in flight
+            parse_results, digest_inputs = itertools.tee(parse_results)
+        summaries = summarize_concurrently(llm_client, pending_codes, concurrency, chunk_tokens, digest_inputs)
+
+    prompt_tokens = 0
+    prompt_modes = Counter()
+    # Chunks go straight to the output file instead of accumulating in memory
+    with journal, JsonArrayWriter(output_path) as output:
+        for idx, row, entry in selected:
+            code = row["code"]
+
+            with instrument.span('file', file=prepare_data.row_filename(row), resumed=entry is not None):
+                if entry is not None:
+                    chunk = dict(entry["chunk"], original_code=code)
+                    parsed = tuple(entry["parsed"]) + (None,)
+                    kg_file = entry["kg_file"]
+                    relationships = None
+                else:
+                    logger.info(f" Working on {row["text"]}")
+                    summary, usage = next(summaries)
+                    parsed = next(parse_results)
+                    chunk = make_chunk(str(idx), row, summary, chunk_tokens)
+                    chunk["llm_usage"] = usage
+                    if usage is not None:
+                        prompt_tokens += usage['prompt_tokens']
+                        prompt_modes[usage['prompt_mode']] += 1
+
+                    # Parsing & Knowledge Graph
+                    relationships, kg_file = build_knowledge_graph(idx, parsed, kf, kg_format, kg_manifest)
+
+                module_name, input_ports, output_ports, signals, parameters, operations, ast = parsed
+
+                if connectivity_builder is not None and module_name:
+                    if relationships is None:
+                        relationships = extract.extract_entities(
+                            module_name, input_ports, output_ports, signals, parameters, operations
+                        )[4]
+                    connectivity_builder.add_module(module_name, relationships)
+
+                if builder is not None:
+                    builder.add_module(
+                        module_name, input_ports, output_ports, signals, parameters, operations,
+                        source=row.get("path", prepare_data.row_filename(row))
+                    )
+
+                output.write(chunk)
+                if entry is None:
+                    journal.append(idx, code, chunk, parsed, kg_file)
+
+    # Compact mode falls back to the full code per module, so the label counts the modes actually sent
+    modes = ', '.join(f'{count} {mode}' for mode, count in sorted(prompt_modes.items())) or 'none'
+    logger.info(f'Prompt tokens: {prompt_tokens} for {sum(prompt_modes.values())} modules ({modes})')
+
+    if connectivity_builder is not None:
+        index = connectivity_builder.build()
+        saved = index.save(connectivity_index)
+        logger.info(f'Connectivity index saved to {saved}: {index.num_nodes} nodes, {index.num_edges} edges')
+
+    if builder is not None:
+        builder.close()
+        if design_store and kg_incremental:
+            design_graph.update_store(design_graph_file, design_store, builder.fingerprints)
+        elif design_store:
+            design_graph.load_into_store(design_graph_file, design_store, builder.fingerprints)
+
+    if kg_manifest is not None:
+        save_kg_manifest(kf, kg_manifest)
+
+    # Embedding reads the chunks back from the output file a batch at a time
+    chroma_path = CHROMA_PATH
+    with instrument.span('chroma', mode=chroma_mode, chunks=output.count):
+        if chroma_mode == 'incremental':
+            collection = sync_chroma(prepare_data.iter_dataset(output_path), chroma_path, embedder)
+        else:
+            collection = store_in_chroma(prepare_data.iter_dataset(output_path), None, chroma_path, embedder=embedder)
+            logger.info(f'Generated embeddings for {collection.count()} records')
+    logger.info(f'Chroma DB saved to {chroma_path}')
 
-    print(f"Processing completed. Output saved to {output_path}")
+    logger.info(f"Processing completed. Output saved to {output_path}")
 
 
 def main():
@@ -192,14 +669,14 @@ def main():
     parser.add_argument(
         "--client",
         required=True,
-        choices=["openai", "google-genai", "anthropic"],
+        choices=sorted(PROVIDERS) + ["stub", "replay"],
         help="Which LLM provider to use."
     )
 
     parser.add_argument(
         "--input",
         required=True,
-        help="Path to input JSON file."
+        help="Path to input JSON or JSONL dataset."
     )
 
     parser.add_argument(
@@ -217,7 +694,7 @@ def main():
     parser.add_argument(
         "--files",
         nargs="*",
-        help="Specific .sv/.v files to include (optional)."
+        help="Exact .sv/.v file names to include (optional, defaults to all)."
     )
 
     parser.add_argument(
@@ -226,10 +703,300 @@ def main():
         help="Specific folder containing sv/v files"
     )
 
+    parser.add_argument(
+        "--summary_cache",
+        default="./summary_cache.sqlite",
+        help="Path to the on-disk LLM summary cache."
+    )
+
+    parser.add_argument(
+        "--no_summary_cache",
+        action="store_true",
+        help="Always call the LLM, ignoring the summary cache."
+    )
+
+    parser.add_argument(
+        "--cache_max_mb",
+        type=float,
+        default=512,
+        help="Evict least recently used entries above this size (per cache)."
+    )
+
+    parser.add_argument(
+        "--cache_max_age_days",
+        type=float,
+        default=None,
+        help="Evict entries older than this many days (optional)."
+    )
+
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of summaries requested from the LLM in parallel."
+    )
+
+    parser.add_argument(
+        "--rpm",
+        type=int,
+        default=None,
+        help="Requests per minute allowed for the provider (defaults per provider)."
+    )
+
+    parser.add_argument(
+        "--tpm",
+        type=int,
+        default=None,
+        help="Tokens per minute allowed for the provider (defaults per provider)."
+    )
+
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60.0,
+        help="Per-request timeout in seconds for LLM and embedding API calls."
+    )
+
+    parser.add_argument(
+        "--max_retries",
+        type=int,
+        default=5,
+        help="Retries with exponential backoff (honoring Retry-After) for 429, 5xx and connection errors."
+    )
+
+    parser.add_argument(
+        "--stub_latency",
+        type=float,
+        default=0.5,
+        help="Simulated seconds per request for --client stub."
+    )
+
+    parser.add_argument(
+        "--cassette",
+        default=None,
+        help="JSONL cassette of recorded completions, served by --client replay."
+    )
+
+    parser.add_argument(
+        "--record",
+        default=None,
+        help="Append every live completion to this JSONL cassette for later replay."
+    )
+
+    parser.add_argument(
+        "--replay_latency",
+        type=float,
+        default=None,
+        help="Fixed seconds per replayed request (default: the recorded latency)."
+    )
+
+    parser.add_argument(
+        "--replay_jitter",
+        type=float,
+        default=0.0,
+        help="Extra uniform random delay, up to this many seconds, per replayed request."
+    )
+
+    parser.add_argument(
+        "--batch",
+        choices=sorted(batch.TRANSPORTS),
+        default=None,
+        help="Summarize through a provider batch API (or the local file stand-in) instead of --client requests."
+    )
+
+    parser.add_argument(
+        "--batch_dir",
+        default="./batch_jobs",
+        help="Directory for batch request and result files."
+    )
+
+    parser.add_argument(
+        "--batch_poll",
+        type=float,
+        default=60.0,
+        help="Seconds between batch status checks."
+    )
+
+    parser.add_argument(
+        "--prompt_mode",
+        choices=compact.PROMPT_MODES,
+        default="full",
+        help="Send the whole module, or a parser digest plus code with repetitive statements elided."
+    )
+
+    parser.add_argument(
+        "--chroma_mode",
+        choices=["rebuild", "incremental"],
+        default="rebuild",
+        help="Rebuild the Chroma collection, or upsert only new/changed chunks."
+    )
+
+    parser.add_argument(
+        "--embedder",
+        choices=sorted(EMBEDDERS),
+        default="openai",
+        help="Embedding backend: OpenAI API, or a local hashed n-gram vectorizer that needs no network."
+    )
+
+    parser.add_argument(
+        "--embedding_dim",
+        type=int,
+        default=None,
+        help="Vector dimension for the embedder (default: the backend's own)."
+    )
+
+    parser.add_argument(
+        "--chunk_tokens",
+        type=int,
+        default=6000,
+        help="Token budget per summary/embedding request; larger modules are split at always/assign/instance boundaries (0 disables)."
+    )
+
+    parser.add_argument(
+        "--parse_workers",
+        type=int,
+        default=None,
+        help="Processes used for RTL parsing (defaults to the CPU count)."
+    )
+
+    parser.add_argument(
+        "--parse_cache",
+        default="./parse_cache.sqlite",
+        help="Path to the on-disk parse result cache."
+    )
+
+    parser.add_argument(
+        "--no_parse_cache",
+        action="store_true",
+        help="Always reparse RTL, ignoring the parse cache."
+    )
+
+    parser.add_argument(
+        "--kg_format",
+        choices=extract.KG_FORMATS,
+        default="ttl",
+        help="Knowledge graph output: Turtle for inspection, or streamed N-Triples/N-Quads (optionally gzipped)."
+    )
+
+    parser.add_argument(
+        "--kg_incremental",
+        action="store_true",
+        help="Rewrite only the KG files and design store graphs of modules whose RTL changed."
+    )
+
+    parser.add_argument(
+        "--design_graph",
+        default=None,
+        help="Also write one merged, per-module namespaced design graph (.nq or .nq.gz)."
+    )
+
+    parser.add_argument(
+        "--design_store",
+        default=None,
+        help="Load the design graph into a persistent Oxigraph store at this path."
+    )
+
+    parser.add_argument(
+        "--connectivity_index",
+        default=None,
+        help="Write a fan-in/fan-out connectivity index (.npz) for connectivity.py queries."
+    )
+
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        help="Checkpoint journal of finished rows (default: <output>.journal.jsonl)."
+    )
+
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip rows already recorded in the checkpoint journal instead of starting over."
+    )
+
+    parser.add_argument(
+        "--trace",
+        default=None,
+        help="Write per-stage timings and counters (.json Chrome trace or .jsonl)."
+    )
+
+    parser.add_argument(
+        "--log_level",
+        default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="Logging verbosity."
+    )
+
     args = parser.parse_args()
 
-    llm_client = LLMClient(args.client)
-    process_file(args.input, args.output, args.kf, args.files, args.include_folder, llm_client)
+    logging.basicConfig(level=args.log_level, format="%(message)s")
+
+    if args.design_store and not args.design_graph:
+        parser.error("--design_store requires --design_graph")
+    if args.client == "replay" and not args.cassette:
+        parser.error("--client replay requires --cassette")
+    if args.record and args.client == "replay":
+        parser.error("--record needs a live provider, not --client replay")
+
+    cache = None
+    if not args.no_summary_cache:
+        cache = SummaryCache(
+            args.summary_cache,
+            max_bytes=int(args.cache_max_mb * 1024 * 1024),
+            max_age=args.cache_max_age_days * 86400 if args.cache_max_age_days is not None else None
+        )
+
+    parse_cache = None
+    if not args.no_parse_cache:
+        parse_cache = ParseCache(
+            args.parse_cache,
+            max_bytes=int(args.cache_max_mb * 1024 * 1024),
+            max_age=args.cache_max_age_days * 86400 if args.cache_max_age_days is not None else None
+        )
+
+    llm_client = make_llm_client(
+        args.client, cache,
+        rpm=args.rpm, tpm=args.tpm, timeout=args.timeout, max_retries=args.max_retries,
+        stub_latency=args.stub_latency, cassette=args.cassette, record=args.record,
+        replay_latency=args.replay_latency, replay_jitter=args.replay_jitter
+    )
+    embedder = make_embedder(args.embedder, args.embedding_dim, args.timeout, args.max_retries)
+
+    batch_transport = None
+    if args.batch:
+        complete = batch.local_completer(args.cassette) if args.batch == "local" else None
+        batch_transport = batch.get_transport(args.batch, args.batch_dir, MODELS.get(args.batch), complete)
+    process_file(
+        args.input, args.output, args.kf, args.files, args.include_folder, llm_client,
+        concurrency=args.concurrency,
+        chroma_mode=args.chroma_mode,
+        parse_workers=args.parse_workers,
+        parse_cache=parse_cache,
+        kg_format=args.kg_format,
+        design_graph_file=args.design_graph,
+        design_store=args.design_store,
+        connectivity_index=args.connectivity_index,
+        kg_incremental=args.kg_incremental,
+        chunk_tokens=args.chunk_tokens,
+        embedder=embedder,
+        batch_transport=batch_transport,
+        batch_poll=args.batch_poll,
+        checkpoint_path=args.checkpoint,
+        resume=args.resume,
+        prompt_mode=args.prompt_mode
+    )
+
+    if cache is not None:
+        stats = cache.stats()
+        logger.info(f"Summary cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+    if parse_cache is not None:
+        stats = parse_cache.stats()
+        logger.info(f"Parse cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+
+    logger.info(instrument.tracer.format_summary())
+    if args.trace:
+        instrument.tracer.write(args.trace)
+        logger.info(f"Trace written to {args.trace}")
 
 
 if __name__ == "__main__":
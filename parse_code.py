@@ -1,10 +1,95 @@
 import re
 from contextlib import redirect_stderr
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import atexit
+import hashlib
+import logging
+import multiprocessing
 import os
 import io
-import uuid
+import shutil
+import tempfile
 import pyverilog.vparser.parser as vparser
-from pyverilog.vparser.parser import parse, Description, ModuleDef, Ioport, Port
+from pyverilog.vparser.parser import Description, ModuleDef, Ioport, Port
+from pyverilog.vparser.preprocessor import VerilogPreprocessor
+import instrument
+
+logger = logging.getLogger(__name__)
+INCLUDE_RE = re.compile(r'^\s*`include\s+"([^"]+)"', re.MULTILINE)
+
+_file_digests = {}
+
+def _file_digest(path):
+    stat = os.stat(path)
+    # One entry per header, replaced when it changes, so long-running processes do not grow
+    memo = _file_digests.get(path)
+    if memo is None or memo[0] != (stat.st_mtime_ns, stat.st_size):
+        with open(path, 'rb') as f:
+            data = f.read()
+        memo = (
+            (stat.st_mtime_ns, stat.st_size), hashlib.sha256(data).hexdigest(),
+            data.decode('utf-8', errors='replace')
+        )
+        _file_digests[path] = memo
+    return memo[1], memo[2]
+
+def _find_include(name, search_dirs):
+    for directory in search_dirs:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return os.path.abspath(path)
+    return None
+
+def resolve_includes(code, include_folder):
+    include_dirs = list(include_folder or [])
+    hashes = {}
+    stack = [(code, include_dirs)]
+    # Walk every header reachable through `include so any edit changes the result
+    while stack:
+        text, search_dirs = stack.pop()
+        for name in INCLUDE_RE.findall(text):
+            path = _find_include(name, search_dirs)
+            entry = path or name
+            if entry in hashes:
+                continue
+            if path is None:
+                hashes[entry] = 'missing'
+                continue
+            digest, header = _file_digest(path)
+            hashes[entry] = digest
+            stack.append((header, [os.path.dirname(path)] + include_dirs))
+    return sorted(hashes.items())
+
+_parser = None
+
+def _verilog_parser():
+    # One parser per process. pyverilog's parse() rebuilds the ply tables on every
+    # call and writes them to ./parsetab.py, so concurrent workers would race on it
+    global _parser
+    if _parser is None:
+        table_dir = tempfile.mkdtemp(prefix='pyverilog_tables_')
+        atexit.register(shutil.rmtree, table_dir, True)
+        with redirect_stderr(io.StringIO()):
+            _parser = vparser.VerilogParser(outputdir=table_dir, debug=False)
+    return _parser
+
+def pyverilog_parse(path, include_folder):
+    # iverilog's output goes to a private file rather than the shared ./preprocess.output
+    fd, output = tempfile.mkstemp(suffix='.out')
+    os.close(fd)
+    try:
+        VerilogPreprocessor([path], output, include_folder).preprocess()
+        with open(output) as f:
+            text = f.read()
+    finally:
+        os.remove(output)
+    parser = _verilog_parser()
+    parser.lexer.reset_lineno()
+    parser.lexer.directives = []
+    parser.lexer.default_nettype = 'wire'
+    return parser.parse(text)
+
 def preprocess_verilog(code):
     def replace_idx(match):
         idx = match.group(1)
@@ -12,44 +97,60 @@ def preprocess_verilog(code):
     code = re.sub(r'`IDX\((\d+)\)', replace_idx, code)
     return code
 
+OPERAND_RE = re.compile(r'\b[\w\[\]:]+\b')
+PORT_DECL_RE = re.compile(r'^(input|output|inout)\s*(wire|reg)?\s*(\[[\w\-`]+:[0-9]+\])?\s*([\w,\s]+)\s*[,;]')
+SIGNAL_DECL_RE = re.compile(r'^(wire|reg)\s*(\[[\w\-`]+:[0-9]+\])?\s*([\w,\s]+)\s*;')
+PARAM_DECL_RE = re.compile(r'^parameter\s+(.+?);')
+PARAM_SPLIT_RE = re.compile(r',\s*(?=\w+\s*=)')
+PARAM_PAIR_RE = re.compile(r'(\w+)\s*=\s*([^,\s]+(?:\s*[^,\s]+)*)')
+INSTANCE_RE = re.compile(r'^(\w+)\s+(\w+)\s*\(([^)]+)\);')
+ASSIGN_RE = re.compile(r'^assign\s+([\w\[\]:]+)\s*=\s*([^;]+);')
+NB_ASSIGN_RE = re.compile(r'^([\w\[\]:]+)\s*<\=\s*([^;]+);')
+BLOCK_ASSIGN_RE = re.compile(r'^([\w\[\]:]+)\s*=\s*([^;]+);')
+HEADER_PORT_RE = re.compile(r'^(input|output|inout)?\s*(wire|reg)?\s*(\[[\w\-`]+:[0-9]+\])?\s*(\w+)')
+
+PORT_KEYWORDS = ('input', 'output', 'inout')
+SIGNAL_KEYWORDS = ('wire', 'reg')
+
 def classify_operation(expr):
     expr = expr.strip()
+    # Operator characters are never part of an operand token, so one scan
+    # of the raw expression yields the same operands for every branch
     if '&' in expr and not '&&' in expr:
         op_type = 'AND'
-        operands = re.findall(r'\b[\w\[\]:]+\b', expr.replace('&', ' '))
     elif '|' in expr and not '||' in expr:
         op_type = 'OR'
-        operands = re.findall(r'\b[\w\[\]:]+\b', expr.replace('|', ' '))
     elif '^' in expr:
         op_type = 'XOR'
-        operands = re.findall(r'\b[\w\[\]:]+\b', expr.replace('^', ' '))
     elif '+' in expr:
         op_type = 'ADD'
-        operands = re.findall(r'\b[\w\[\]:]+\b', expr.replace('+', ' '))
     elif '-' in expr and not '->' in expr:
         op_type = 'SUBTRACT'
-        operands = re.findall(r'\b[\w\[\]:]+\b', expr.replace('-', ' '))
     elif '<<' in expr:
         op_type = 'LSHIFT'
-        operands = re.findall(r'\b[\w\[\]:]+\b', expr.replace('<<', ' '))
     elif '>>' in expr:
         op_type = 'RSHIFT'
-        operands = re.findall(r'\b[\w\[\]:]+\b', expr.replace('>>', ' '))
     elif '~' in expr:
         op_type = 'NOT'
-        operands = re.findall(r'\b[\w\[\]:]+\b', expr.replace('~', ' '))
     elif '<=' in expr:
         op_type = 'NON_BLOCKING_ASSIGN'
-        operands = re.findall(r'\b[\w\[\]:]+\b', expr)
     elif '=' in expr and '==' not in expr:
         op_type = 'ASSIGN'
-        operands = re.findall(r'\b[\w\[\]:]+\b', expr)
     else:
         op_type = 'UNKNOWN'
-        operands = re.findall(r'\b[\w\[\]:]+\b', expr)
-    return op_type, operands
+    return op_type, OPERAND_RE.findall(expr)
 
-def parse_verilog_code(code, include_folder, temp_file='temp.v'):
+def assign_operation_ids(module_name, operations):
+    # IDs derive from content, so identical RTL yields identical operation URIs
+    occurrences = {}
+    for op in operations:
+        base = '\x1f'.join([module_name or '', op['target'], op['expression'], op['context'] or ''])
+        occurrence = occurrences.get(base, 0)
+        occurrences[base] = occurrence + 1
+        op['id'] = hashlib.sha1(f'{base}\x1f{occurrence}'.encode('utf-8')).hexdigest()[:16]
+    return operations
+
+def parse_verilog_code(code, include_folder, temp_file=None, use_pyverilog=True):
     module_name = None
     input_ports = []
     output_ports = []
@@ -61,197 +162,279 @@ def parse_verilog_code(code, include_folder, temp_file='temp.v'):
     port_directions = {}
 
     code = preprocess_verilog(code)
-    with open(temp_file, 'w') as f:
-        f.write(code)
+    if use_pyverilog:
+        # A private file per call lets several parses run side by side
+        if temp_file is None:
+            fd, temp_file = tempfile.mkstemp(suffix='.v')
+            with os.fdopen(fd, 'w') as f:
+                f.write(code)
+        else:
+            with open(temp_file, 'w') as f:
+                f.write(code)
 
-    try:
-        f = io.StringIO()
-        with redirect_stderr(f):
-            ast, _ = parse([temp_file], preprocess_include=include_folder, debug=False)
-        if isinstance(ast.description, Description):
-            for node in ast.description.definitions:
-                if isinstance(node, ModuleDef):
-                    module_name = node.name
-                    if node.portlist:
-                        for port in node.portlist.ports:
-                            if isinstance(port, Ioport) and hasattr(port.first, 'name'):
-                                port_name = port.first.name
-                                width = '1'
-                                if hasattr(port.first, 'width') and port.first.width:
-                                    width = f'[{port.first.width.msb}:{port.first.width.lsb}]'
-                                if isinstance(port.first, vparser.Input):
-                                    input_ports.append((port_name, width))
-                                elif isinstance(port.first, vparser.Output):
-                                    output_ports.append((port_name, width))
-                            elif isinstance(port, Port) and hasattr(port, 'name'):
-                                header_ports.append((port.name, '1'))
-    except Exception as e:
-        print(f'Pyverilog parsing failed: {str(e)}')
+        with instrument.span('parse.pyverilog'):
+            try:
+                f = io.StringIO()
+                with redirect_stderr(f):
+                    ast = pyverilog_parse(temp_file, include_folder)
+                if isinstance(ast.description, Description):
+                    for node in ast.description.definitions:
+                        if isinstance(node, ModuleDef):
+                            module_name = node.name
+                            if node.portlist:
+                                for port in node.portlist.ports:
+                                    if isinstance(port, Ioport) and hasattr(port.first, 'name'):
+                                        port_name = port.first.name
+                                        width = '1'
+                                        if hasattr(port.first, 'width') and port.first.width:
+                                            width = f'[{port.first.width.msb}:{port.first.width.lsb}]'
+                                        if isinstance(port.first, vparser.Input):
+                                            input_ports.append((port_name, width))
+                                        elif isinstance(port.first, vparser.Output):
+                                            output_ports.append((port_name, width))
+                                    elif isinstance(port, Port) and hasattr(port, 'name'):
+                                        header_ports.append((port.name, '1'))
+            except Exception as e:
+                logger.warning(f'Pyverilog parsing failed: {str(e)}')
 
-    try:
-        lines = code.splitlines()
-        module_found = False
-        in_module_decl = False
-        port_section = []
-        i = 0
-        always_context = None
-
-        while i < len(lines):
-            line = lines[i].strip()
-            if line.startswith('//') or not line:
-                i += 1
-                continue
-            if line.startswith('module'):
-                candidate_name = line.split()[1].split('(')[0].strip()
-                module_name = candidate_name
-                module_found = True
-                if '(' in line:
-                    in_module_decl = True
-                    start_idx = line.index('(') + 1
+    input_names = {name for name, _ in input_ports}
+    output_names = {name for name, _ in output_ports}
+
+    def add_port(direction, port_name, width):
+        if direction == 'input' and port_name not in input_names:
+            input_ports.append((port_name, width))
+            input_names.add(port_name)
+        elif direction == 'output' and port_name not in output_names:
+            output_ports.append((port_name, width))
+            output_names.add(port_name)
+
+    def add_operation(op_type, target, expr, operands, context):
+        operations.append({
+            'id': None,
+            'type': op_type,
+            'target': target,
+            'expression': expr,
+            'operands': operands,
+            'context': context
+        })
+
+    with instrument.span('parse.heuristic'):
+        try:
+            lines = code.splitlines()
+            module_found = False
+            in_module_decl = False
+            port_section = []
+            i = 0
+            always_context = None
+
+            # Each line is dispatched on its leading keyword so only the
+            # patterns that can possibly match it are tried
+            while i < len(lines):
+                line = lines[i].strip()
+                if line.startswith('//') or not line:
+                    i += 1
+                    continue
+                if line.startswith('module'):
+                    candidate_name = line.split()[1].split('(')[0].strip()
+                    module_name = candidate_name
+                    module_found = True
+                    if '(' in line:
+                        in_module_decl = True
+                        start_idx = line.index('(') + 1
+                        if ')' in line:
+                            port_section.append(line[start_idx:line.index(')')])
+                            in_module_decl = False
+                        else:
+                            port_section.append(line[start_idx:])
+                    i += 1
+                    continue
+                if in_module_decl:
                     if ')' in line:
-                        port_section.append(line[start_idx:line.index(')')])
+                        port_section.append(line[:line.index(')')])
                         in_module_decl = False
                     else:
-                        port_section.append(line[start_idx:])
-                i += 1
-                continue
-            if in_module_decl:
-                if ')' in line:
-                    port_section.append(line[:line.index(')')])
-                    in_module_decl = False
-                else:
-                    port_section.append(line)
-                i += 1
-                continue
-            if module_found:
-                port_match = re.match(r'^(input|output|inout)\s*(wire|reg)?\s*(\[[\w\-`]+:[0-9]+\])?\s*([\w,\s]+)\s*[,;]', line)
-                if port_match:
-                    direction = port_match.group(1)
-                    width = port_match.group(3) if port_match.group(3) else '1'
-                    port_names = [p.strip() for p in port_match.group(4).split(',') if p.strip()]
-                    for port_name in port_names:
-                        port_directions[port_name] = direction
-                        if direction == 'input' and port_name not in [p[0] for p in input_ports]:
-                            input_ports.append((port_name, width))
-                        elif direction == 'output' and port_name not in [p[0] for p in output_ports]:
-                            output_ports.append((port_name, width))
-                signal_match = re.match(r'^(wire|reg)\s*(\[[\w\-`]+:[0-9]+\])?\s*([\w,\s]+)\s*;', line)
-                if signal_match:
-                    signal_type = signal_match.group(1)
-                    width = signal_match.group(2) if signal_match.group(2) else '1'
-                    signal_names = [s.strip() for s in signal_match.group(3).split(',')]
-                    for signal_name in signal_names:
-                        if signal_name not in [p[0] for p in input_ports + output_ports]:
-                            signals.append((signal_name, signal_type, width))
-                param_match = re.match(r'^parameter\s+(.+?);', line)
-                if param_match:
-                    param_str = param_match.group(1).strip()
-                    param_pairs = re.split(r',\s*(?=\w+\s*=)', param_str)
-                    for pair in param_pairs:
-                        pair_match = re.match(r'(\w+)\s*=\s*([^,\s]+(?:\s*[^,\s]+)*)', pair.strip())
-                        if pair_match:
-                            param_name = pair_match.group(1).strip()
-                            param_value = pair_match.group(2).strip()
-                            print(f'Parsed parameter: name={param_name}, value={param_value}')
-                            parameters.append((param_name, param_value))
-                inst_match = re.match(r'^(\w+)\s+(\w+)\s*\(([^)]+)\);', line)
-                if inst_match:
-                    module_type = inst_match.group(1)
-                    instance_name = inst_match.group(2)
-                    ports = [p.strip() for p in inst_match.group(3).split(',')]
-                    operations.append({
-                        'id': str(uuid.uuid4()),
-                        'type': 'INSTANTIATION',
-                        'target': instance_name,
-                        'expression': f"{module_type}({', '.join(ports)})",
-                        'operands': ports,
-                        'context': 'structural'
-                    })
-                assign_match = re.match(r'^assign\s+([\w\[\]:]+)\s*=\s*([^;]+);', line)
-                if assign_match:
-                    target = assign_match.group(1)
-                    expr = assign_match.group(2).strip()
-                    op_type, operands = classify_operation(expr)
-                    operations.append({
-                        'id': str(uuid.uuid4()),
-                        'type': op_type,
-                        'target': target,
-                        'expression': expr,
-                        'operands': operands,
-                        'context': 'combinational'
-                    })
-                if line.startswith('always @'):
-                    if '@(*)' in line or '@(' in line and 'posedge' not in line:
-                        always_context = 'combinational'
-                    elif 'posedge' in line:
-                        always_context = 'sequential'
+                        port_section.append(line)
                     i += 1
-                    while i < len(lines) and not lines[i].strip().startswith('endmodule'):
-                        stmt = lines[i].strip()
-                        if stmt and not stmt.startswith('//'):
-                            nb_assign_match = re.match(r'^([\w\[\]:]+)\s*<\=\s*([^;]+);', stmt)
-                            if nb_assign_match:
-                                target = nb_assign_match.group(1).strip()
-                                expr = nb_assign_match.group(2).strip()
-                                op_type, operands = classify_operation(expr)
-                                operations.append({
-                                    'id': str(uuid.uuid4()),
-                                    'type': op_type,
-                                    'target': target,
-                                    'expression': expr,
-                                    'operands': operands,
-                                    'context': always_context
-                                })
-                            block_assign_match = re.match(r'^([\w\[\]:]+)\s*=\s*([^;]+);', stmt)
-                            if block_assign_match:
-                                target = block_assign_match.group(1).strip()
-                                expr = block_assign_match.group(2).strip()
-                                op_type, operands = classify_operation(expr)
-                                operations.append({
-                                    'id': str(uuid.uuid4()),
-                                    'type': op_type,
-                                    'target': target,
-                                    'expression': expr,
-                                    'operands': operands,
-                                    'context': always_context
-                                })
-                        i += 1
                     continue
-            i += 1
-
-        if port_section:
-            port_text = ' '.join(port_section).replace(';', ',')
-            port_list = [p.strip() for p in port_text.split(',') if p.strip() and not p.strip().startswith('//')]
-            for port in port_list:
-                match = re.match(r'^(input|output|inout)?\s*(wire|reg)?\s*(\[[\w\-`]+:[0-9]+\])?\s*(\w+)', port)
-                if match and match.group(1):
-                    width = match.group(3) if match.group(3) else '1'
-                    port_name = match.group(4)
-                    direction = match.group(1)
-                    port_directions[port_name] = direction
-                    if direction == 'input' and port_name not in [p[0] for p in input_ports]:
-                        input_ports.append((port_name, width))
-                    elif direction == 'output' and port_name not in [p[0] for p in output_ports]:
-                        output_ports.append((port_name, width))
-                else:
-                    header_ports.append((port, '1'))
-
-        for port_name, width in header_ports:
-            direction = port_directions.get(port_name, 'input')
-            if direction == 'input' and port_name not in [p[0] for p in input_ports]:
-                input_ports.append((port_name, width))
-            elif direction == 'output' and port_name not in [p[0] for p in output_ports]:
-                output_ports.append((port_name, width))
-
-        if not module_found:
-            print('No valid module found in code')
-        else:
-            print(f'Parsed module: {module_name}')
+                if module_found:
+                    if line.startswith(PORT_KEYWORDS):
+                        port_match = PORT_DECL_RE.match(line)
+                        if port_match:
+                            direction = port_match.group(1)
+                            width = port_match.group(3) if port_match.group(3) else '1'
+                            for port_name in port_match.group(4).split(','):
+                                port_name = port_name.strip()
+                                if port_name:
+                                    port_directions[port_name] = direction
+                                    add_port(direction, port_name, width)
+                    elif line.startswith(SIGNAL_KEYWORDS):
+                        signal_match = SIGNAL_DECL_RE.match(line)
+                        if signal_match:
+                            signal_type = signal_match.group(1)
+                            width = signal_match.group(2) if signal_match.group(2) else '1'
+                            for signal_name in signal_match.group(3).split(','):
+                                signal_name = signal_name.strip()
+                                if signal_name not in input_names and signal_name not in output_names:
+                                    signals.append((signal_name, signal_type, width))
+                    elif line.startswith('parameter'):
+                        param_match = PARAM_DECL_RE.match(line)
+                        if param_match:
+                            param_str = param_match.group(1).strip()
+                            for pair in PARAM_SPLIT_RE.split(param_str):
+                                pair_match = PARAM_PAIR_RE.match(pair.strip())
+                                if pair_match:
+                                    param_name = pair_match.group(1).strip()
+                                    param_value = pair_match.group(2).strip()
+                                    logger.debug(f'Parsed parameter: name={param_name}, value={param_value}')
+                                    parameters.append((param_name, param_value))
+                    if ');' in line:
+                        inst_match = INSTANCE_RE.match(line)
+                        if inst_match:
+                            module_type = inst_match.group(1)
+                            instance_name = inst_match.group(2)
+                            ports = [p.strip() for p in inst_match.group(3).split(',')]
+                            add_operation('INSTANTIATION', instance_name,
+                                          f"{module_type}({', '.join(ports)})", ports, 'structural')
+                    if line.startswith('assign'):
+                        assign_match = ASSIGN_RE.match(line)
+                        if assign_match:
+                            target = assign_match.group(1)
+                            expr = assign_match.group(2).strip()
+                            op_type, operands = classify_operation(expr)
+                            add_operation(op_type, target, expr, operands, 'combinational')
+                    elif line.startswith('always @'):
+                        if '@(*)' in line or '@(' in line and 'posedge' not in line:
+                            always_context = 'combinational'
+                        elif 'posedge' in line:
+                            always_context = 'sequential'
+                        i += 1
+                        while i < len(lines) and not lines[i].strip().startswith('endmodule'):
+                            stmt = lines[i].strip()
+                            if stmt and not stmt.startswith('//'):
+                                nb_assign_match = NB_ASSIGN_RE.match(stmt)
+                                if nb_assign_match:
+                                    target = nb_assign_match.group(1).strip()
+                                    expr = nb_assign_match.group(2).strip()
+                                    op_type, operands = classify_operation(expr)
+                                    add_operation(op_type, target, expr, operands, always_context)
+                                block_assign_match = BLOCK_ASSIGN_RE.match(stmt)
+                                if block_assign_match:
+                                    target = block_assign_match.group(1).strip()
+                                    expr = block_assign_match.group(2).strip()
+                                    op_type, operands = classify_operation(expr)
+                                    add_operation(op_type, target, expr, operands, always_context)
+                            i += 1
+                        continue
+                i += 1
 
-    except Exception as e:
-        print(f'Heuristic parsing failed: {str(e)}')
+            if port_section:
+                port_text = ' '.join(port_section).replace(';', ',')
+                port_list = [p.strip() for p in port_text.split(',') if p.strip() and not p.strip().startswith('//')]
+                for port in port_list:
+                    match = HEADER_PORT_RE.match(port)
+                    if match and match.group(1):
+                        width = match.group(3) if match.group(3) else '1'
+                        port_name = match.group(4)
+                        direction = match.group(1)
+                        port_directions[port_name] = direction
+                        add_port(direction, port_name, width)
+                    else:
+                        header_ports.append((port, '1'))
+
+            for port_name, width in header_ports:
+                add_port(port_directions.get(port_name, 'input'), port_name, width)
+
+            if not module_found:
+                logger.warning('No valid module found in code')
+            else:
+                logger.debug(f'Parsed module: {module_name}')
 
-    if os.path.exists(temp_file):
+        except Exception as e:
+            logger.warning(f'Heuristic parsing failed: {str(e)}')
+
+    if temp_file is not None and os.path.exists(temp_file):
         os.remove(temp_file)
 
-    return module_name, input_ports, output_ports, signals, parameters, operations, ast
\ No newline at end of file
+    assign_operation_ids(module_name, operations)
+
+    return module_name, input_ports, output_ports, signals, parameters, operations, ast
+
+
+def _safe_parse(code, include_folder, keep_ast=True):
+    try:
+        with instrument.span('parse') as span_args:
+            result = parse_verilog_code(code, include_folder)
+            span_args['module'] = result[0]
+            span_args['operations'] = len(result[5])
+    except Exception as e:
+        logger.error(f'Parsing failed: {str(e)}')
+        return None, [], [], [], [], [], None
+    if not keep_ast:
+        result = result[:-1] + (None,)
+    return result
+
+
+def _init_worker():
+    # Tables are generated once per worker instead of on its first parse
+    _verilog_parser()
+
+
+def _parse_worker(code, include_folder):
+    # The pyverilog AST is not needed downstream and is costly to ship between processes
+    instrument.tracer.drain()
+    result = _safe_parse(code, include_folder, keep_ast=False)
+    return result, instrument.tracer.drain()
+
+
+def _merge_trace(result, trace):
+    instrument.tracer.merge(*trace)
+    return result
+
+
+def parse_many(codes, include_folder, workers=None, cache=None, window=None):
+    # Results come back in input order; at most `window` codes are read ahead of the consumer
+    executor = None
+    if workers != 1:
+        # Workers come from a forkserver: by now the caller may be running summary threads, and
+        # a plain fork could copy a lock (tracer, logging) that one of them holds
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('forkserver'), initializer=_init_worker
+        )
+        window = window or (workers or os.cpu_count() or 1) * 4
+
+    def lookup(code):
+        if cache is None:
+            return None, None
+        key = cache.key(code, resolve_includes(code, include_folder))
+        hit = cache.get_result(key)
+        instrument.count('cache.parse.hits' if hit is not None else 'cache.parse.misses')
+        return key, (hit + (None,) if hit is not None else None)
+
+    def store(key, result):
+        if cache is not None and result[0] is not None:
+            cache.set_result(key, result[:-1])
+        return result
+
+    def resolve(key, hit, future):
+        return hit if hit is not None else store(key, _merge_trace(*future.result()))
+
+    def collect():
+        if executor is None:
+            for code in codes:
+                key, hit = lookup(code)
+                yield hit if hit is not None else store(key, _safe_parse(code, include_folder))
+            return
+        in_flight = deque()
+        try:
+            for code in codes:
+                key, hit = lookup(code)
+                future = executor.submit(_parse_worker, code, include_folder) if hit is None else None
+                in_flight.append((key, hit, future))
+                if len(in_flight) >= window:
+                    yield resolve(*in_flight.popleft())
+            while in_flight:
+                yield resolve(*in_flight.popleft())
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    return collect()
@@ -1,7 +1,9 @@
 import os
 import json
 import argparse
+import hashlib
 import re
+from multiprocessing import Pool
 
 def remove_sv_comments(code: str) -> str:
     code = re.sub(r"/\*.*?\*/", "", code, flags=re.DOTALL)
@@ -35,6 +37,96 @@ def load_sv_files(folder_path):
 
     return dataset
 
+def iter_sv_paths(folder_path):
+    for root, dirs, files in os.walk(folder_path):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.lower().endswith((".sv", ".v")):
+                yield os.path.join(root, filename)
+
+def build_record(file_path, folder_path):
+    with open(file_path, "rb") as f:
+        raw = f.read()
+    stat = os.stat(file_path)
+
+    return {
+        "text": f"SystemVerilog module from file: {os.path.basename(file_path)}",
+        "code": remove_sv_comments(raw.decode("utf-8", errors="replace")),
+        "path": os.path.relpath(file_path, folder_path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha256": hashlib.sha256(raw).hexdigest()
+    }
+
+def _build_record_args(args):
+    return build_record(*args)
+
+def stream_sv_files(folder_path, output_path, workers=None):
+    count = 0
+    tasks = ((path, folder_path) for path in iter_sv_paths(folder_path))
+
+    # Records are written as soon as each file is ready so readers can tail the output
+    with Pool(workers) as pool, open(output_path, "w") as out:
+        for record in pool.imap(_build_record_args, tasks, chunksize=4):
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            count += 1
+
+    return count
+
+def row_filename(row):
+    if "path" in row:
+        return os.path.basename(row["path"])
+    return row["text"].rsplit("file: ", 1)[-1].strip()
+
+def _iter_json_array(f, chunk_size=1 << 16):
+    decoder = json.JSONDecoder()
+    buf = f.read(chunk_size)
+    pos = len(buf) - len(buf.lstrip())
+    if buf[pos:pos + 1] != "[":
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    eof = False
+    # Grows while one item is still incomplete, so a huge row costs O(size) decode attempts in total
+    read_size = chunk_size
+
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buf) and buf[pos] == "]":
+            return
+        if pos < len(buf):
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                end = None
+            # An item is only complete once something follows it in the buffer
+            if end is not None and (end < len(buf) or eof):
+                yield obj
+                pos = end
+                read_size = chunk_size
+                continue
+        if eof:
+            raise ValueError("Truncated JSON array")
+        chunk = f.read(read_size)
+        read_size *= 2
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+def iter_dataset(path):
+    with open(path, "r") as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first == "[":
+            yield from _iter_json_array(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
 def main():
     parser = argparse.ArgumentParser(
         description="Build a JSON dataset from SystemVerilog files in a folder."
@@ -52,8 +144,29 @@ def main():
         help="Path to output JSON file."
     )
 
+    parser.add_argument(
+        "--format",
+        choices=["json", "jsonl"],
+        default=None,
+        help="Output format; jsonl streams records from a recursive scan (default: from --output extension)."
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Processes used to strip comments in jsonl mode (defaults to the CPU count)."
+    )
+
     args = parser.parse_args()
 
+    output_format = args.format or ("jsonl" if args.output.endswith(".jsonl") else "json")
+
+    if output_format == "jsonl":
+        count = stream_sv_files(args.input_folder, args.output, args.workers)
+        print(f"Dataset created with {count} entries -> {args.output}")
+        return
+
     dataset = load_sv_files(args.input_folder)
 
     with open(args.output, "w") as f:
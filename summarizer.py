@@ -0,0 +1,190 @@
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+MODELS = {
+    "openai": "gpt-5",
+    "google-genai": "gemini-2.5-pro",
+    "anthropic": "claude-sonnet-4-5-20250929",
+}
+
+# Requests/min and tokens/min used when no explicit limit is given
+PROVIDER_LIMITS = {
+    "openai": (500, 200000),
+    "google-genai": (60, 250000),
+    "anthropic": (50, 40000),
+}
+
+# Budget reserved for the completion when charging the tokens/min bucket
+COMPLETION_TOKENS = 400
+
+PROMPT_TEMPLATE = """
+        Provide a detailed summary of the following Verilog module,
+        including its functionality, inputs, outputs, parameters, and key operations.
+
+        Verilog Code:
+        ```verilog
+        {code}
+        ```
+
+        Summary requirements:
+        - 100-200 words
+        - Purpose of the module
+        - Inputs / outputs (with widths)
+        - Parameters
+        - Main logic / operations
+        - Notable features (FSM, sequential, etc.)
+        """
+
+COMPACT_TEMPLATE = """
+        Provide a detailed summary of the following Verilog module,
+        including its functionality, inputs, outputs, parameters, and key operations.
+        The digest was extracted by a parser and lists every port, signal, parameter
+        and instance; in the code, runs of similar statements are cut to their first
+        and last occurrences.
+
+        {code}
+
+        Summary requirements:
+        - 100-200 words
+        - Purpose of the module
+        - Inputs / outputs (with widths)
+        - Parameters
+        - Main logic / operations
+        - Notable features (FSM, sequential, etc.)
+        """
+
+SECTION_TEMPLATE = """
+        The following is one section of a larger Verilog module.
+        Summarize what this section does: the signals it drives and reads,
+        its operations, and any state machines or sequential logic.
+
+        Verilog Code:
+        ```verilog
+        {code}
+        ```
+
+        Summary requirements:
+        - 50-100 words
+        - Only describe logic present in this section
+        """
+
+COMBINE_TEMPLATE = """
+        The following are summaries of consecutive sections of one Verilog module.
+        Combine them into a detailed summary of the whole module.
+
+        Section summaries:
+        {code}
+
+        Summary requirements:
+        - 100-200 words
+        - Purpose of the module
+        - Inputs / outputs (with widths)
+        - Parameters
+        - Main logic / operations
+        - Notable features (FSM, sequential, etc.)
+        """
+
+
+def combine_sections(sections):
+    return "\n\n".join(f"Section {i + 1}/{len(sections)}:\n{summary}" for i, summary in enumerate(sections))
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def new_usage(mode="full"):
+    return {'prompt_mode': mode, 'requests': 0, 'cached': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+            'latency': 0.0}
+
+
+def add_usage(usage, prompt_tokens, completion_tokens, latency=None):
+    # Prompt tokens count even on a cache hit, so modes compare by prompt size; latency is live calls only
+    usage['prompt_tokens'] += prompt_tokens
+    usage['completion_tokens'] += completion_tokens
+    if latency is None:
+        usage['cached'] += 1
+    else:
+        usage['requests'] += 1
+        usage['latency'] = round(usage['latency'] + latency, 6)
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiter:
+    def __init__(self, rpm=None, tpm=None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+    def acquire(self, tokens):
+        if self.requests is not None:
+            self.requests.acquire(1)
+        if self.tokens is not None:
+            self.tokens.acquire(tokens + COMPLETION_TOKENS)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider, rpm=None, tpm=None):
+    default_rpm, default_tpm = PROVIDER_LIMITS.get(provider, (None, None))
+    rpm = rpm if rpm is not None else default_rpm
+    tpm = tpm if tpm is not None else default_tpm
+    key = (provider, rpm, tpm)
+    # Clients of the same provider share one bucket so limits hold process-wide
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(rpm, tpm)
+        return _limiters[key]
+
+
+def summarize_concurrently(llm_client, codes, concurrency=4, max_tokens=None, parsed=None):
+    """Yields ``(summary, usage)`` per code, in input order.
+
+    ``parsed`` (parse results aligned with ``codes``) switches to compact
+    prompts.
+    """
+    items = zip(codes, parsed if parsed is not None else itertools.repeat(None))
+
+    def summarize(code, parsed_module):
+        usage = new_usage()
+        return llm_client.summarize_module(code, max_tokens, parsed_module, usage), usage
+
+    if concurrency <= 1:
+        for code, parsed_module in items:
+            yield summarize(code, parsed_module)
+        return
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = deque()
+        for code, parsed_module in items:
+            pending.append(executor.submit(summarize, code, parsed_module))
+            # Keep a bounded window in flight and hand results back in input order
+            if len(pending) >= concurrency * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
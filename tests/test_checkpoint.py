@@ -0,0 +1,97 @@
+import json
+
+import main
+from checkpoint import JsonArrayWriter, Journal
+
+PARSED = ('top', [('clk', '')], [('y', '[7:0]')], [], [], [], None)
+
+
+def write_kg(tmp_path, name='kg_0.ttl'):
+    path = tmp_path / name
+    path.write_text('')
+    return str(path)
+
+
+def test_completed_rows_match_code_and_kg_file(tmp_path):
+    kg_file = write_kg(tmp_path)
+    path = str(tmp_path / 'journal.jsonl')
+    with Journal(path) as journal:
+        journal.append(0, 'module top; endmodule', {'id': '0', 'summary': 's', 'original_code': 'x'}, PARSED, kg_file)
+
+    journal = Journal(path, resume=True)
+    entry = journal.completed(0, 'module top; endmodule', kg_file)
+    assert entry['chunk'] == {'id': '0', 'summary': 's', 'original_code': None}
+    assert entry['parsed'] == json.loads(json.dumps(list(PARSED[:6])))
+    # Edited code, a different KG path or a deleted KG file all mean the row is redone
+    assert journal.completed(0, 'module top2; endmodule', kg_file) is None
+    assert journal.completed(0, 'module top; endmodule', str(tmp_path / 'kg_1.ttl')) is None
+    (tmp_path / 'kg_0.ttl').unlink()
+    assert journal.completed(0, 'module top; endmodule', kg_file) is None
+    journal.close()
+
+
+def test_torn_line_is_skipped_and_not_appended_to(tmp_path):
+    kg_file = write_kg(tmp_path)
+    path = tmp_path / 'journal.jsonl'
+    with Journal(str(path)) as journal:
+        journal.append(0, 'a', {'id': '0'}, PARSED, kg_file)
+    with open(path, 'a') as f:
+        f.write('{"row": 1, "code_sha')
+
+    with Journal(str(path), resume=True) as journal:
+        assert set(journal.entries) == {0}
+        journal.append(2, 'c', {'id': '2'}, PARSED, kg_file)
+
+    assert set(Journal.load(str(path))) == {0, 2}
+
+
+def test_json_array_writer_matches_json_dump(tmp_path):
+    items = [{'id': '0', 'segments': [[0, 3]]}, {'id': '1', 'summary': 'two\nlines'}]
+    path = str(tmp_path / 'out.json')
+    with JsonArrayWriter(path) as writer:
+        for item in items:
+            writer.write(item)
+
+    with open(path) as f:
+        assert f.read() == json.dumps(items, indent=2)
+
+
+def test_json_array_writer_keeps_previous_output_on_error(tmp_path):
+    path = tmp_path / 'out.json'
+    path.write_text('[]')
+    try:
+        with JsonArrayWriter(str(path)) as writer:
+            writer.write({'id': '0'})
+            raise RuntimeError('interrupted')
+    except RuntimeError:
+        pass
+
+    assert path.read_text() == '[]'
+
+
+def test_resumed_run_reproduces_the_output(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dataset = tmp_path / 'data.jsonl'
+    with open(dataset, 'w') as f:
+        for i in range(4):
+            code = f'module m{i} (input a, output y);\n  assign y = ~a;\nendmodule\n'
+            f.write(json.dumps({'text': f'SystemVerilog module from file: m{i}.v', 'code': code}) + '\n')
+
+    def run(output, resume=False, checkpoint=None):
+        main.process_file(
+            str(dataset), output, 'kf', None, None, main.StubLLMClient(latency=0), parse_workers=1,
+            embedder=main.make_embedder('hashing'), resume=resume, checkpoint_path=checkpoint
+        )
+        with open(output) as f:
+            chunks = json.load(f)
+        for chunk in chunks:
+            chunk['llm_usage'].pop('latency')
+        return chunks
+
+    full = run('full.json')
+    # Interrupted after two rows, the second one only half written
+    lines = (tmp_path / 'full.json.journal.jsonl').read_text().splitlines(keepends=True)
+    (tmp_path / 'partial.jsonl').write_text(lines[0] + lines[1][:40])
+
+    assert run('resumed.json', resume=True, checkpoint='partial.jsonl') == full
+    assert len(Journal.load('partial.jsonl')) == 4
@@ -0,0 +1,80 @@
+import pytest
+
+import main
+from embedding import HashingEmbedder
+
+
+def chunk(path, summary='summary'):
+    code = f'module {path.split("/")[0]}_child (input a, output y);\n  assign y = a;\nendmodule\n'
+    row = {'text': 'SystemVerilog module from file: child.v', 'code': code, 'path': path}
+    return main.make_chunk(path, row, summary)
+
+
+def stored_ids(collection):
+    return sorted(collection.get()['ids'])
+
+
+def test_same_file_name_in_different_folders_gets_distinct_ids():
+    a, b = chunk('a/child.v'), chunk('b/child.v')
+
+    assert a['text'] == b['text']
+    assert main.stable_chunk_id(a) != main.stable_chunk_id(b)
+
+
+def test_chunks_without_a_path_fall_back_to_the_text():
+    text = 'SystemVerilog module from file: top.v'
+
+    assert main.stable_chunk_id({'text': text}) == main.stable_chunk_id({'text': text, 'id': '7'})
+    assert main.stable_chunk_id({'text': text}) != main.stable_chunk_id({'text': text + ' '})
+
+
+def test_sync_keeps_both_colliding_files(tmp_path):
+    path = str(tmp_path / 'chroma')
+    embedder = HashingEmbedder(dim=64)
+
+    collection = main.sync_chroma([chunk('a/child.v'), chunk('b/child.v')], path, embedder)
+    assert stored_ids(collection) == ['a/child.v', 'b/child.v']
+
+    # Dropping one file removes only its own record
+    collection = main.sync_chroma([chunk('b/child.v')], path, embedder)
+    assert stored_ids(collection) == ['b/child.v']
+    assert collection.get(ids=['b/child.v'])['metadatas'][0]['source'] == 'b/child.v'
+
+
+def test_sync_drops_repeated_paths(tmp_path):
+    collection = main.sync_chroma(
+        [chunk('a/child.v', 'first'), chunk('a/child.v', 'second')], str(tmp_path / 'chroma'), HashingEmbedder(dim=64)
+    )
+
+    assert stored_ids(collection) == ['a/child.v']
+    assert collection.get(ids=['a/child.v'])['metadatas'][0]['summary'] == 'first'
+
+
+def test_failed_rebuild_keeps_the_previous_collection(tmp_path):
+    path = str(tmp_path / 'chroma')
+    embedder = HashingEmbedder(dim=64)
+    main.store_in_chroma([chunk('a/child.v'), chunk('b/child.v')], None, path, embedder=embedder)
+
+    def interrupted():
+        yield chunk('a/child.v', 'new')
+        raise RuntimeError('interrupted')
+
+    with pytest.raises(RuntimeError):
+        main.store_in_chroma(interrupted(), None, path, embedder=embedder, batch_size=1)
+
+    client = main.chroma_client(path)
+    assert [collection.name for collection in client.list_collections()] == ['verilog_modules']
+    collection = client.get_collection('verilog_modules')
+    assert stored_ids(collection) == ['a/child.v', 'b/child.v']
+    assert collection.get(ids=['a/child.v'])['metadatas'][0]['summary'] == 'summary'
+
+
+def test_rebuild_replaces_the_collection(tmp_path):
+    path = str(tmp_path / 'chroma')
+    embedder = HashingEmbedder(dim=64)
+    main.store_in_chroma([chunk('a/child.v'), chunk('b/child.v')], None, path, embedder=embedder)
+
+    collection = main.store_in_chroma([chunk('b/child.v', 'new')], None, path, embedder=embedder)
+
+    assert collection.name == 'verilog_modules'
+    assert stored_ids(main.chroma_client(path).get_collection('verilog_modules')) == ['b/child.v']
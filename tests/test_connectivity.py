@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from connectivity import ConnectivityBuilder, ConnectivityIndex
+
+
+def uses(op, signal):
+    return {'type': 'uses_signal', 'source': op, 'target': f'signal_{signal}'}
+
+
+def produces(op, signal):
+    return {'type': 'produces_signal', 'source': op, 'target': f'signal_{signal}'}
+
+
+@pytest.fixture
+def index():
+    builder = ConnectivityBuilder()
+    # s = a + b; r <= s; y = r; count <= count + en
+    builder.add_module('m', [
+        uses('op_add', 'a'), uses('op_add', 'b'), produces('op_add', 's'),
+        uses('op_reg', 's'), produces('op_reg', 'r'),
+        uses('op_out', 'r'), produces('op_out', 'y'),
+        uses('op_count', 'count'), uses('op_count', 'en'), produces('op_count', 'count'),
+    ])
+    return builder.build()
+
+
+def test_fan_in_and_fan_out(index):
+    assert sorted(index.fan_in('m.y')) == ['m.a', 'm.b', 'm.r', 'm.s']
+    assert sorted(index.fan_out('m.a')) == ['m.r', 'm.s', 'm.y']
+    assert index.fan_in('m.a') == []
+
+
+def test_depth_counts_signal_hops(index):
+    assert index.fan_in('m.y', depth=1) == ['m.r']
+    assert sorted(index.fan_in('m.y', depth=2)) == ['m.r', 'm.s']
+
+
+def test_feedback_register_is_in_its_own_cone(index):
+    assert sorted(index.fan_in('m.count')) == ['m.count', 'm.en']
+    assert index.fan_out('m.count') == ['m.count']
+    assert sorted(index.fan_out('m.en')) == ['m.count']
+
+
+def test_cone_of_influence_keeps_starts_only_when_reached(index):
+    assert sorted(index.cone_of_influence(['m.y', 'm.s'])) == ['m.a', 'm.b', 'm.r', 'm.s']
+    assert sorted(index.cone_of_influence(['m.y', 'm.count'])) == ['m.a', 'm.b', 'm.count', 'm.en', 'm.r', 'm.s']
+
+
+def test_csr_matches_the_edge_list():
+    src = np.array([2, 0, 1, 0], dtype=np.int64)
+    dst = np.array([1, 2, 2, 1], dtype=np.int64)
+    index = ConnectivityIndex.from_edges(src, dst, ['x', 'y', 'z'], ['signal'] * 3)
+
+    for node in range(3):
+        out = index.out_indices[index.out_indptr[node]:index.out_indptr[node + 1]]
+        assert sorted(out) == sorted(dst[src == node])
+        inbound = index.in_indices[index.in_indptr[node]:index.in_indptr[node + 1]]
+        assert sorted(inbound) == sorted(src[dst == node])
+
+
+@pytest.mark.parametrize('name', ['conn', 'conn.npz'])
+def test_saved_index_loads_from_the_same_path(index, tmp_path, name):
+    path = str(tmp_path / name)
+
+    assert index.save(path) == str(tmp_path / 'conn.npz')
+    loaded = ConnectivityIndex.load(path)
+    assert sorted(loaded.fan_in('m.y')) == sorted(index.fan_in('m.y'))
@@ -0,0 +1,58 @@
+import pytest
+
+import fake_server
+from embedding import FakeEmbedder, OpenAIEmbedder, embed_in_batches, pack_batches
+from transport import CircuitOpenError
+
+
+def test_pack_batches_respects_item_and_token_limits():
+    texts = ['x' * 40] * 5
+
+    assert list(pack_batches(texts, max_tokens=25, max_items=10)) == [[0, 1], [2, 3], [4]]
+    assert list(pack_batches(texts, max_tokens=1000, max_items=2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_rejected_items_are_isolated():
+    embedder = FakeEmbedder(dim=4, fail_on=lambda text: text == 'too long')
+    texts = ['a', 'b', 'too long', 'c']
+
+    vectors = embed_in_batches(texts, embedder)
+
+    assert [vector is None for vector in vectors] == [False, False, True, False]
+    assert vectors[0] == embedder.embed(['a'])[0]
+
+
+def test_transient_failures_fail_the_batch_without_bisecting():
+    embedder = FakeEmbedder(dim=4, fail_rate=1.0)
+
+    assert embed_in_batches(['a', 'b', 'c', 'd'], embedder) == [None] * 4
+    assert embedder.calls == 1
+
+
+def test_open_circuit_is_raised():
+    class OpenCircuit:
+        dim = 4
+        calls = 0
+
+        def embed(self, texts):
+            self.calls += 1
+            raise CircuitOpenError('Circuit for openai-embeddings is open')
+
+    embedder = OpenCircuit()
+    with pytest.raises(CircuitOpenError):
+        embed_in_batches(['a', 'b', 'c', 'd'], embedder)
+    assert embedder.calls == 1
+
+
+def test_openai_embedder_requests_its_dimension():
+    openai = pytest.importorskip('openai')
+    server = fake_server.start_server()
+    try:
+        client = openai.OpenAI(
+            base_url=f'http://127.0.0.1:{server.server_address[1]}/v1', api_key='test', max_retries=0
+        )
+        vectors = OpenAIEmbedder(dim=8, client=client).embed(['a', 'b'])
+    finally:
+        server.shutdown()
+
+    assert [len(vector) for vector in vectors] == [8, 8]
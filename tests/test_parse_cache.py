@@ -0,0 +1,62 @@
+import parse_code
+from cache import ParseCache
+
+CODE = '''`include "defs.vh"
+module top (input clk, input [7:0] a, output reg [7:0] y);
+  always @(posedge clk) y <= a;
+endmodule
+'''
+
+
+def parse_once(code, include_folder, cache):
+    return next(parse_code.parse_many([code], include_folder, workers=1, cache=cache))
+
+
+def test_include_hashes_follow_nested_headers(tmp_path):
+    (tmp_path / 'defs.vh').write_text('`include "widths.vh"\n')
+    (tmp_path / 'widths.vh').write_text('`define W 8\n')
+
+    names = [name for name, _ in parse_code.resolve_includes(CODE, [str(tmp_path)])]
+
+    assert names == [str(tmp_path / 'defs.vh'), str(tmp_path / 'widths.vh')]
+
+
+def test_missing_header_is_part_of_the_key(tmp_path):
+    assert parse_code.resolve_includes(CODE, [str(tmp_path)]) == [('defs.vh', 'missing')]
+
+
+def test_header_change_invalidates_cached_parse(tmp_path, monkeypatch):
+    (tmp_path / 'defs.vh').write_text('`include "widths.vh"\n')
+    widths = tmp_path / 'widths.vh'
+    widths.write_text('`define W 8\n')
+    include_folder = [str(tmp_path)]
+    cache = ParseCache(str(tmp_path / 'parse.sqlite'))
+    parsed = []
+
+    def fake_parse(code, include_folder):
+        parsed.append(code)
+        return 'top', [], [], [], [], [], None
+
+    monkeypatch.setattr(parse_code, '_safe_parse', fake_parse)
+
+    parse_once(CODE, include_folder, cache)
+    parse_once(CODE, include_folder, cache)
+    assert len(parsed) == 1
+
+    # A header two levels down changes: the source is the same but the cached result is stale
+    widths.write_text('`define W 16\n')
+    parse_once(CODE, include_folder, cache)
+    assert len(parsed) == 2
+    cache.close()
+
+
+def test_parse_cache_round_trips_results(tmp_path):
+    cache = ParseCache(str(tmp_path / 'parse.sqlite'))
+    key = cache.key(CODE, [])
+    result = ('top', [('clk', '')], [('y', '[7:0]')], [], [], [])
+
+    assert cache.get_result(key) is None
+    cache.set_result(key, result)
+    assert cache.get_result(key) == result
+    assert cache.key(CODE, [('defs.vh', 'missing')]) != key
+    cache.close()
@@ -0,0 +1,27 @@
+import io
+import json
+
+import pytest
+
+import prepare_data
+
+
+def test_json_array_items_larger_than_the_read_size():
+    rows = [{'text': 'a', 'code': 'x' * 5000}, {'text': 'b', 'code': 'y'}, {'text': 'c', 'code': '"]}, ['}]
+    text = json.dumps(rows, indent=2)
+
+    assert list(prepare_data._iter_json_array(io.StringIO(text), chunk_size=16)) == rows
+
+
+def test_truncated_json_array_is_an_error():
+    with pytest.raises(ValueError, match='Truncated'):
+        list(prepare_data._iter_json_array(io.StringIO('[{"text": "a"}, {"text": '), chunk_size=8))
+
+
+def test_jsonl_and_json_array_datasets_read_the_same(tmp_path):
+    rows = [{'text': 'a', 'code': 'module a; endmodule'}, {'text': 'b', 'code': 'module b; endmodule'}]
+    (tmp_path / 'rows.json').write_text(json.dumps(rows))
+    (tmp_path / 'rows.jsonl').write_text(''.join(json.dumps(row) + '\n' for row in rows))
+
+    assert list(prepare_data.iter_dataset(str(tmp_path / 'rows.json'))) == rows
+    assert list(prepare_data.iter_dataset(str(tmp_path / 'rows.jsonl'))) == rows
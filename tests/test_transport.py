@@ -0,0 +1,123 @@
+import pytest
+
+import transport
+from transport import CircuitBreaker, CircuitOpenError, RetryPolicy, call_with_retry
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f'status {status_code}')
+        self.status_code = status_code
+        self.response = type('Response', (), {'headers': headers or {}})()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(transport.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(transport.time, 'sleep', clock.sleep)
+    return clock
+
+
+def flaky(*outcomes):
+    calls = []
+
+    def fn():
+        outcome = outcomes[len(calls)]
+        calls.append(outcome)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return fn, calls
+
+
+def test_transient_errors_are_retried(clock):
+    fn, calls = flaky(StatusError(503), StatusError(429), 'ok')
+
+    assert call_with_retry(fn, RetryPolicy(max_retries=5, seed=0)) == 'ok'
+    assert len(calls) == 3
+
+
+def test_client_errors_are_not_retried(clock):
+    fn, calls = flaky(StatusError(400), 'ok')
+
+    with pytest.raises(StatusError):
+        call_with_retry(fn, RetryPolicy(max_retries=5, seed=0))
+    assert len(calls) == 1
+
+
+def test_gives_up_after_max_retries(clock):
+    fn, calls = flaky(*[StatusError(503)] * 4)
+
+    with pytest.raises(StatusError):
+        call_with_retry(fn, RetryPolicy(max_retries=3, seed=0))
+    assert len(calls) == 4
+
+
+def test_retry_after_header_sets_the_delay():
+    policy = RetryPolicy(max_delay=30.0, seed=0)
+
+    assert policy.delay(0, StatusError(429, {'retry-after': '2'})) == 2.0
+    assert policy.delay(0, StatusError(429, {'retry-after-ms': '250'})) == 0.25
+    assert policy.delay(0, StatusError(429, {'retry-after': '600'})) == 30.0
+
+
+def test_breaker_opens_and_fails_fast(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0, name='test')
+    fn, calls = flaky(StatusError(503), StatusError(503))
+
+    with pytest.raises(StatusError):
+        call_with_retry(fn, RetryPolicy(max_retries=1, seed=0), breaker)
+    assert breaker.state == 'open'
+
+    # Nothing reaches the endpoint while the circuit is open
+    with pytest.raises(CircuitOpenError):
+        call_with_retry(lambda: calls.append('called'), RetryPolicy(max_retries=0), breaker)
+    assert len(calls) == 2
+
+
+def test_breaker_trial_call_closes_it(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0, name='test')
+    breaker.failure()
+    assert breaker.state == 'open'
+
+    clock.now += 10.0
+    assert breaker.state == 'half-open'
+    breaker.before()
+    # Only one trial call is let through at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before()
+    breaker.success()
+    assert breaker.state == 'closed'
+
+
+def test_failed_trial_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0, name='test')
+    for _ in range(3):
+        breaker.failure()
+    clock.now += 10.0
+    breaker.before()
+    breaker.failure()
+
+    assert breaker.state == 'open'
+
+
+def test_client_errors_do_not_trip_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0, name='test')
+    fn, _ = flaky(StatusError(400))
+
+    with pytest.raises(StatusError):
+        call_with_retry(fn, RetryPolicy(max_retries=3, seed=0), breaker)
+    assert breaker.state == 'closed'
@@ -0,0 +1,121 @@
+import os
+
+import pytest
+
+import main
+from embedding import HashingEmbedder
+from watch import ChangeMonitor, IncrementalPipeline, WorkQueue, scan, watch
+
+CHILD = '''`include "defs.vh"
+module {name} (input [`W-1:0] a, output [`W-1:0] y);
+  assign y = ~a;
+endmodule
+'''
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = str(tmp_path / 'rtl')
+    write(os.path.join(root, 'defs.vh'), '`define W 8\n')
+    write(os.path.join(root, 'a', 'child.v'), CHILD.format(name='child_a'))
+    write(os.path.join(root, 'b', 'child.v'), 'module child_b (input a, output y);\n  assign y = a;\nendmodule\n')
+    return root
+
+
+@pytest.fixture
+def pipeline(tree, tmp_path):
+    embedder = HashingEmbedder(dim=64)
+    pipeline = IncrementalPipeline(
+        tree, str(tmp_path / 'kf'), None, main.StubLLMClient(latency=0), embedder,
+        main.open_collection(str(tmp_path / 'chroma'), embedder)
+    )
+    processed = []
+    process = pipeline.process
+
+    def record(path):
+        processed.append(os.path.relpath(path, tree))
+        process(path)
+
+    pipeline.process = record
+    pipeline.processed = processed
+    return pipeline
+
+
+def run_once(monitor, pipeline):
+    pipeline.processed.clear()
+    watch(monitor, pipeline, workers=2, interval=0.01, once=True)
+    return sorted(pipeline.processed)
+
+
+def record_ids(pipeline):
+    return sorted(pipeline.collection.get()['ids'])
+
+
+def test_changes_are_reported_once_they_settle(tree):
+    monitor = ChangeMonitor(tree, debounce=1.0)
+    path = os.path.join(tree, 'defs.vh')
+
+    assert monitor.poll(now=0.0) == []
+    write(path, '`define W 16\n')
+    assert monitor.poll(now=0.5) == []
+    assert monitor.poll(now=1.2) == sorted(set(scan(tree)) - {path})
+    assert monitor.poll(now=1.5) == [path]
+    assert monitor.poll(now=5.0) == []
+
+    os.remove(path)
+    assert monitor.poll(now=6.0) == []
+    assert monitor.poll(now=7.0) == [path]
+
+
+def test_work_queue_hands_a_path_to_one_worker_at_a_time():
+    work = WorkQueue()
+    work.put('a.v')
+    work.put('a.v')
+    assert work.get() == 'a.v'
+
+    # Changed again while being processed: queued once more when the worker is done
+    work.put('a.v')
+    work.put('b.v')
+    assert work.get() == 'b.v'
+    work.done('b.v')
+    work.done('a.v')
+    assert work.get() == 'a.v'
+    work.done('a.v')
+
+    work.close()
+    assert work.get() is None
+
+
+def test_header_change_requeues_its_dependents(tree, pipeline):
+    monitor = ChangeMonitor(tree, debounce=0.0)
+
+    assert run_once(monitor, pipeline) == ['a/child.v', 'b/child.v', 'defs.vh']
+    assert record_ids(pipeline) == ['a/child.v', 'b/child.v']
+
+    write(os.path.join(tree, 'defs.vh'), '`define W 16\n')
+    assert run_once(monitor, pipeline) == ['a/child.v', 'defs.vh']
+
+
+def test_deleting_one_of_two_same_named_files_keeps_the_other(tree, pipeline):
+    monitor = ChangeMonitor(tree, debounce=0.0)
+    run_once(monitor, pipeline)
+
+    os.remove(os.path.join(tree, 'a', 'child.v'))
+    assert run_once(monitor, pipeline) == ['a/child.v']
+    assert record_ids(pipeline) == ['b/child.v']
+    assert sorted(os.listdir(pipeline.kf)) == ['.kg_manifest.json', 'kg_b__child.v.ttl']
+
+
+def test_prune_removes_files_deleted_while_not_watching(tree, pipeline):
+    run_once(ChangeMonitor(tree, debounce=0.0), pipeline)
+    os.remove(os.path.join(tree, 'b', 'child.v'))
+
+    assert pipeline.prune(scan(tree)) == 1
+    assert record_ids(pipeline) == ['a/child.v']
+    assert sorted(os.listdir(pipeline.kf)) == ['.kg_manifest.json', 'kg_a__child.v.ttl']
@@ -0,0 +1,188 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+
+import instrument
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+RETRYABLE_ERRORS = {'APIConnectionError', 'APITimeoutError', 'ConnectError', 'ReadTimeout', 'ConnectTimeout',
+                    'RemoteProtocolError', 'ReadError', 'WriteError', 'PoolTimeout', 'TimeoutException'}
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+def status_code(exc):
+    for value in (getattr(exc, 'status_code', None), getattr(exc, 'code', None),
+                  getattr(getattr(exc, 'response', None), 'status_code', None)):
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def retry_after(exc):
+    headers = getattr(getattr(exc, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        # Retry-After may also be an HTTP date
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+def is_retryable(exc):
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    return isinstance(exc, (ConnectionError, TimeoutError)) or any(
+        cls.__name__ in RETRYABLE_ERRORS for cls in type(exc).__mro__
+    )
+
+
+class RetryPolicy:
+    def __init__(self, max_retries=5, base_delay=0.5, max_delay=30.0, seed=None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, attempt, exc=None):
+        hinted = retry_after(exc) if exc is not None else None
+        if hinted is not None:
+            return min(hinted, self.max_delay)
+        # Full jitter keeps clients that failed together from retrying together
+        with self._lock:
+            return self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Fails fast after ``failure_threshold`` consecutive failures.
+
+    After ``reset_timeout`` seconds one trial call is let through; its
+    outcome closes the breaker again or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=10, reset_timeout=30.0, name=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def remaining(self):
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def before(self):
+        with self._lock:
+            state = self.state
+            if state == 'open' or (state == 'half-open' and self._trial):
+                raise CircuitOpenError(f"Circuit for {self.name} is open after {self.failures} failures")
+            if state == 'half-open':
+                self._trial = True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f'Circuit for {self.name} opened after {self.failures} failures')
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+
+def call_with_retry(fn, policy=None, breaker=None, name='request'):
+    policy = policy or RetryPolicy()
+    attempt = 0
+    while True:
+        if breaker is not None:
+            try:
+                breaker.before()
+            except CircuitOpenError:
+                # While open nothing reaches the endpoint; waiting out the breaker uses up a retry
+                if attempt >= policy.max_retries:
+                    raise
+                time.sleep(max(breaker.remaining(), policy.delay(attempt)))
+                attempt += 1
+                continue
+        try:
+            result = fn()
+        except Exception as e:
+            retryable = is_retryable(e)
+            # Only transient failures count against the endpoint; a 400 means it answered
+            if breaker is not None and retryable:
+                breaker.failure()
+            elif breaker is not None:
+                breaker.success()
+            if not retryable or attempt >= policy.max_retries:
+                raise
+            delay = policy.delay(attempt, e)
+            logger.warning(f'{name} failed ({type(e).__name__}: {status_code(e) or e}); '
+                           f'retry {attempt + 1}/{policy.max_retries} in {delay:.2f}s')
+            instrument.count(f'{name}.retries')
+            time.sleep(delay)
+            attempt += 1
+            continue
+        if breaker is not None:
+            breaker.success()
+        return result
+
+
+_breakers = {}
+_pools = {}
+_lock = threading.Lock()
+
+
+def get_breaker(name, failure_threshold=10, reset_timeout=30.0):
+    # One breaker per endpoint, shared by every client in the process
+    with _lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(failure_threshold, reset_timeout, name)
+        return _breakers[name]
+
+
+def http_client(factory=None):
+    """Process-wide keep-alive connection pool, one per HTTP client class.
+
+    SDKs pass their own client class (e.g. ``openai.DefaultHttpxClient``) so
+    every client of that SDK, LLM or embedding, reuses the same connections.
+    """
+    with _lock:
+        if factory not in _pools:
+            if factory is None:
+                import httpx
+                _pools[None] = httpx.Client(limits=httpx.Limits(max_connections=64, max_keepalive_connections=32))
+            else:
+                _pools[factory] = factory()
+        return _pools[factory]
@@ -0,0 +1,480 @@
+import argparse
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import extract
+import instrument
+import parse_code
+import prepare_data
+from cache import ParseCache, SummaryCache
+from compact import PROMPT_MODES
+from embedding import EMBEDDERS
+from main import (
+    CHROMA_PATH, PROVIDERS, build_knowledge_graph, load_kg_manifest, make_chunk, make_embedder,
+    make_llm_client, open_collection, remove_chunk, save_kg_manifest, upsert_chunk
+)
+from summarizer import new_usage
+
+logger = logging.getLogger(__name__)
+
+SOURCE_EXTS = ('.sv', '.v')
+HEADER_EXTS = ('.svh', '.vh')
+TRACE_EVENTS = 10000
+
+
+def scan(root):
+    state = {}
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for filename in files:
+            if filename.lower().endswith(SOURCE_EXTS + HEADER_EXTS):
+                path = os.path.abspath(os.path.join(directory, filename))
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                state[path] = (stat.st_mtime_ns, stat.st_size)
+    return state
+
+
+class ChangeMonitor:
+    """Polls an RTL tree and reports files once their changes have settled.
+
+    A file is reported after ``debounce`` seconds without a further change,
+    so an editor's save burst or a branch checkout is handled once. Every
+    file counts as changed on the first poll.
+    """
+
+    def __init__(self, root, debounce=0.5):
+        self.root = root
+        self.debounce = debounce
+        self.state = {}
+        self.pending = {}
+
+    def poll(self, now=None):
+        now = time.monotonic() if now is None else now
+        current = scan(self.root)
+        for path in current.keys() | self.state.keys():
+            if current.get(path) != self.state.get(path):
+                self.pending[path] = now
+        self.state = current
+        ready = sorted(path for path, changed in self.pending.items() if now - changed >= self.debounce)
+        for path in ready:
+            del self.pending[path]
+        return ready
+
+
+class WorkQueue:
+    """FIFO of file paths in which each path is queued at most once.
+
+    A path that changes again while a worker has it is queued once more
+    when that worker finishes, never handed to a second worker.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._order = deque()
+        self._queued = set()
+        self._active = set()
+        self._again = set()
+        self._closed = False
+
+    def put(self, path):
+        with self._cond:
+            if path in self._active:
+                self._again.add(path)
+            elif path not in self._queued:
+                self._queued.add(path)
+                self._order.append(path)
+                self._cond.notify()
+
+    def get(self):
+        with self._cond:
+            while not self._order and not self._closed:
+                self._cond.wait()
+            if not self._order:
+                return None
+            path = self._order.popleft()
+            self._queued.discard(path)
+            self._active.add(path)
+            return path
+
+    def done(self, path):
+        with self._cond:
+            self._active.discard(path)
+            if path in self._again:
+                self._again.discard(path)
+                self._queued.add(path)
+                self._order.append(path)
+            self._cond.notify_all()
+
+    def join(self):
+        with self._cond:
+            while self._order or self._active:
+                self._cond.wait()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class IncrementalPipeline:
+    """Runs parse, extract, KG and embedding for one RTL file at a time."""
+
+    def __init__(self, root, kf, include_folder, llm_client, embedder, collection, parse_cache=None,
+                 kg_format='ttl', chunk_tokens=6000, prompt_mode='full'):
+        self.root = root
+        self.kf = kf
+        self.include_folder = include_folder or [root]
+        self.llm_client = llm_client
+        self.embedder = embedder
+        self.collection = collection
+        self.parse_cache = parse_cache
+        self.kg_format = kg_format
+        self.chunk_tokens = chunk_tokens
+        self.prompt_mode = prompt_mode
+        self.manifest = load_kg_manifest(kf)
+        # Source path -> absolute paths of every header it pulls in, directly or not
+        self.includes = {}
+        self._lock = threading.Lock()
+        # pyverilog's parser tables are module globals, so parses run one at a time
+        self._parse_lock = threading.Lock()
+        self._chroma_lock = threading.Lock()
+
+    def kg_name(self, rel):
+        return rel.replace(os.sep, '__')
+
+    def dependents(self, path):
+        with self._lock:
+            return sorted(source for source, headers in self.includes.items() if path in headers)
+
+    def process(self, path):
+        rel = os.path.relpath(path, self.root)
+        if not os.path.exists(path):
+            self.remove(path, rel)
+            return
+        if not path.lower().endswith(SOURCE_EXTS):
+            return
+
+        start = time.perf_counter()
+        with instrument.span('watch.file', file=rel):
+            row = prepare_data.build_record(path, self.root)
+            headers = {
+                entry for entry, _ in parse_code.resolve_includes(row["code"], self.include_folder)
+                if os.path.isabs(entry)
+            }
+            with self._lock:
+                self.includes[path] = headers
+
+            with self._parse_lock:
+                parsed = next(parse_code.parse_many(
+                    [row["code"]], self.include_folder, workers=1, cache=self.parse_cache
+                ))
+            if parsed[0] is None:
+                # Usually a half-written save; the last good KG and embeddings stay until it parses
+                logger.warning(f'{rel}: parse failed, keeping the previous KG and embeddings')
+                return
+
+            _, kg_file = build_knowledge_graph(self.kg_name(rel), parsed, self.kf, self.kg_format, self.manifest)
+            with self._lock:
+                save_kg_manifest(self.kf, self.manifest)
+
+            usage = new_usage()
+            summary = self.llm_client.summarize_module(
+                row["code"], self.chunk_tokens, parsed if self.prompt_mode == 'compact' else None, usage
+            )
+            chunk = make_chunk(rel, row, summary, self.chunk_tokens)
+            with self._chroma_lock:
+                embedded, deleted = upsert_chunk(self.collection, chunk, self.embedder)
+
+        instrument.count('watch.files')
+        logger.info(f'Updated {rel} ({parsed[0]}) in {time.perf_counter() - start:.2f}s: '
+                    f'{kg_file}, {usage["prompt_tokens"]} {usage["prompt_mode"]} prompt tokens, '
+                    f'{embedded} records embedded, {deleted} removed')
+
+    def prune(self, paths, page_size=256):
+        # Files deleted while the watcher was not running leave KG files and records behind
+        sources = {os.path.relpath(path, self.root) for path in paths if path.lower().endswith(SOURCE_EXTS)}
+        stale = set()
+        offset = 0
+        while True:
+            page = self.collection.get(include=['metadatas'], limit=page_size, offset=offset)
+            for metadata in page['metadatas']:
+                source = (metadata or {}).get('source')
+                if source and source not in sources:
+                    stale.add(source)
+            if len(page['ids']) < page_size:
+                break
+            offset += page_size
+        kg_files = {os.path.join(self.kf, f"kg_{self.kg_name(rel)}.{self.kg_format}") for rel in sources}
+        for kg_file in [kg_file for kg_file in self.manifest if kg_file not in kg_files]:
+            if os.path.exists(kg_file):
+                os.remove(kg_file)
+            del self.manifest[kg_file]
+        save_kg_manifest(self.kf, self.manifest)
+        for source in sorted(stale):
+            remove_chunk(self.collection, source)
+            logger.info(f'Removed {source} (deleted while not watching)')
+        return len(stale)
+
+    def remove(self, path, rel):
+        with self._lock:
+            self.includes.pop(path, None)
+        if not path.lower().endswith(SOURCE_EXTS):
+            return
+        kg_file = os.path.join(self.kf, f"kg_{self.kg_name(rel)}.{self.kg_format}")
+        if os.path.exists(kg_file):
+            os.remove(kg_file)
+        with self._lock:
+            self.manifest.pop(kg_file, None)
+            save_kg_manifest(self.kf, self.manifest)
+        with self._chroma_lock:
+            remove_chunk(self.collection, rel)
+        instrument.count('watch.removed')
+        logger.info(f'Removed {rel}')
+
+
+def worker(work, pipeline):
+    while True:
+        path = work.get()
+        if path is None:
+            return
+        try:
+            pipeline.process(path)
+        except Exception:
+            logger.exception(f'Failed to process {path}')
+        finally:
+            work.done(path)
+
+
+def watch(monitor, pipeline, workers=2, interval=1.0, once=False):
+    work = WorkQueue()
+    threads = [threading.Thread(target=worker, args=(work, pipeline), daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            for path in monitor.poll():
+                work.put(path)
+                # A changed header invalidates every module that includes it
+                for dependent in pipeline.dependents(path):
+                    if dependent != path:
+                        instrument.count('watch.requeued')
+                        work.put(dependent)
+            if once and not monitor.pending:
+                work.join()
+                return
+            time.sleep(interval)
+    finally:
+        work.close()
+        for thread in threads:
+            thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Watch an RTL tree and re-run parse, KG and embedding for each file as it changes."
+    )
+
+    parser.add_argument(
+        "--root",
+        required=True,
+        help="RTL folder to watch (recursively)."
+    )
+
+    parser.add_argument(
+        "--kf",
+        required=True,
+        help="Path to Knowledge Folder."
+    )
+
+    parser.add_argument(
+        "--client",
+        required=True,
+        choices=sorted(PROVIDERS) + ["stub", "replay"],
+        help="Which LLM provider to use."
+    )
+
+    parser.add_argument(
+        "--include_folder",
+        nargs="*",
+        help="Include search folders (default: --root)."
+    )
+
+    parser.add_argument(
+        "--cassette",
+        default=None,
+        help="JSONL cassette of recorded completions, served by --client replay."
+    )
+
+    parser.add_argument(
+        "--stub_latency",
+        type=float,
+        default=0.5,
+        help="Simulated seconds per request for --client stub."
+    )
+
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60.0,
+        help="Per-request timeout in seconds for LLM and embedding API calls."
+    )
+
+    parser.add_argument(
+        "--max_retries",
+        type=int,
+        default=5,
+        help="Retries with exponential backoff for 429, 5xx and connection errors."
+    )
+
+    parser.add_argument(
+        "--summary_cache",
+        default="./summary_cache.sqlite",
+        help="Path to the on-disk LLM summary cache."
+    )
+
+    parser.add_argument(
+        "--no_summary_cache",
+        action="store_true",
+        help="Always call the LLM, ignoring the summary cache."
+    )
+
+    parser.add_argument(
+        "--parse_cache",
+        default="./parse_cache.sqlite",
+        help="Path to the on-disk parse result cache."
+    )
+
+    parser.add_argument(
+        "--no_parse_cache",
+        action="store_true",
+        help="Always reparse RTL, ignoring the parse cache."
+    )
+
+    parser.add_argument(
+        "--embedder",
+        choices=sorted(EMBEDDERS),
+        default="openai",
+        help="Embedding backend: OpenAI API, or a local hashed n-gram vectorizer."
+    )
+
+    parser.add_argument(
+        "--embedding_dim",
+        type=int,
+        default=None,
+        help="Vector dimension for the embedder (default: the backend's own)."
+    )
+
+    parser.add_argument(
+        "--chroma_path",
+        default=CHROMA_PATH,
+        help="Chroma database updated in place as files change."
+    )
+
+    parser.add_argument(
+        "--kg_format",
+        choices=extract.KG_FORMATS,
+        default="ttl",
+        help="Knowledge graph output format."
+    )
+
+    parser.add_argument(
+        "--chunk_tokens",
+        type=int,
+        default=6000,
+        help="Token budget per summary/embedding request; larger modules are split."
+    )
+
+    parser.add_argument(
+        "--prompt_mode",
+        choices=PROMPT_MODES,
+        default="full",
+        help="Send the whole module, or a parser digest plus code with repetitive statements elided."
+    )
+
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="Seconds between scans of the RTL tree."
+    )
+
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.5,
+        help="Seconds a file must stay unchanged before it is reprocessed."
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=2,
+        help="Files processed in parallel."
+    )
+
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Bring the KG and Chroma up to date with the tree, then exit."
+    )
+
+    parser.add_argument(
+        "--trace",
+        default=None,
+        help="Write per-stage timings and counters (.json Chrome trace or .jsonl) on exit."
+    )
+
+    parser.add_argument(
+        "--log_level",
+        default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="Logging verbosity."
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format="%(message)s")
+
+    if args.client == "replay" and not args.cassette:
+        parser.error("--client replay requires --cassette")
+
+    cache = None if args.no_summary_cache else SummaryCache(args.summary_cache)
+    parse_cache = None if args.no_parse_cache else ParseCache(args.parse_cache)
+    llm_client = make_llm_client(
+        args.client, cache, timeout=args.timeout, max_retries=args.max_retries,
+        stub_latency=args.stub_latency, cassette=args.cassette
+    )
+    embedder = make_embedder(args.embedder, args.embedding_dim, args.timeout, args.max_retries)
+
+    # A daemon would otherwise keep every span it ever traced
+    instrument.tracer.keep_last(TRACE_EVENTS)
+
+    root = os.path.abspath(args.root)
+    pipeline = IncrementalPipeline(
+        root, args.kf, args.include_folder, llm_client, embedder,
+        open_collection(args.chroma_path, embedder), parse_cache, args.kg_format, args.chunk_tokens,
+        args.prompt_mode
+    )
+
+    pipeline.prune(scan(root))
+    logger.info(f'Watching {root} (every {args.interval:g}s, debounce {args.debounce:g}s)')
+    try:
+        watch(ChangeMonitor(root, args.debounce), pipeline, args.workers, args.interval, args.once)
+    except KeyboardInterrupt:
+        logger.info('Stopping')
+
+    logger.info(instrument.tracer.format_summary())
+    if args.trace:
+        instrument.tracer.write(args.trace)
+        logger.info(f"Trace written to {args.trace}")
+
+
+if __name__ == "__main__":
+    main()